@@ -0,0 +1,210 @@
+# blobstore.py
+# Content-addressed storage under DOWNLOAD_ROOT/.blobs so identical media is kept once.
+#
+# Each finished file is hashed, moved into blobs/<aa>/<sha256> and hardlinked back into
+# its task directory. A blob's link count is its reference count: task copies that are
+# served or expire simply unlink, and sweep() drops blobs nobody links to any more
+# unless a live index entry (canonical URL -> blobs) still wants them for cache hits.
+# When the store is over max_bytes, sweep() also evicts unlinked blobs least recently
+# used first, live index entry or not; a lookup of an evicted entry is simply a cache miss.
+# A blob's mtime is its last use: it is touched when it enters the store and on every
+# dedup hit or lookup (st_ctime would do on POSIX, but is the creation time on Windows).
+import os
+import json
+import time
+import shutil
+import tempfile
+import hashlib
+import logging
+from typing import Optional
+
+logger = logging.getLogger("media-downloader")
+
+HASH_CHUNK_BYTES = 1024 * 1024
+# Blobs just moved into the store briefly have nlink == 1 before linking back
+SWEEP_GRACE_SECONDS = 120
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BlobStore:
+    def __init__(self, root: str, ttl_seconds: float, max_bytes: Optional[int] = None):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.index_dir = os.path.join(root, "index")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.index_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    @staticmethod
+    def _touch(blob: str):
+        try:
+            os.utime(blob)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _link(src: str, dest: str):
+        """Hardlink src to dest, falling back to a copy across filesystems."""
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+
+    def add(self, path: str) -> str:
+        """Move path into the store (or drop it if the content is already there) and link it back."""
+        digest = file_digest(path)
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            # link next to path and swap it in, so path is never missing if the blob goes away
+            tmp = f"{path}.{os.getpid()}.link"
+            try:
+                self._link(blob, tmp)
+            except FileNotFoundError:
+                pass  # swept since the exists() check; store this copy instead
+            else:
+                size = os.path.getsize(path)
+                os.replace(tmp, path)
+                self._touch(blob)
+                logger.info("Dedup hit for %s (%s bytes saved)", os.path.basename(path), size)
+                return digest
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # downloaders may date files by upload time; the blob must look new to sweep()
+        os.utime(path)
+        try:
+            os.replace(path, blob)
+        except OSError:
+            # DOWNLOAD_ROOT on another filesystem than the store; pay for one copy
+            shutil.copyfile(path, blob)
+            os.remove(path)
+        self._link(blob, path)
+        return digest
+
+    def ingest(self, key: Optional[str], result):
+        """Store the files of a download result (path or list of paths) and index them under key."""
+        paths = list(result) if isinstance(result, (list, tuple)) else [result]
+        files = []
+        for p in paths:
+            try:
+                files.append({"digest": self.add(p), "filename": os.path.basename(p)})
+            except Exception:
+                logger.exception("Failed to add %s to blob store; leaving it in place", p)
+                return result
+        if key:
+            entry = {"key": key, "multi": isinstance(result, (list, tuple)), "files": files, "created": time.time()}
+            try:
+                # unique tmp name: other threads/processes may be indexing the same key
+                fd, tmp = tempfile.mkstemp(dir=self.index_dir, suffix=".tmp")
+                with open(fd, "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, self._index_path(key))
+            except Exception:
+                logger.exception("Failed to index %s in blob store; the download is kept", key)
+        return result
+
+    def _read_entry(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def lookup(self, key: str, target_dir: str):
+        """Link a cached result for key into target_dir; returns it shaped like the downloader's result, or None."""
+        entry = self._read_entry(self._index_path(key))
+        if not entry or time.time() - entry["created"] > self.ttl_seconds:
+            return None
+        paths = []
+        try:
+            for f in entry["files"]:
+                dest = os.path.join(target_dir, f["filename"])
+                if os.path.exists(dest):
+                    dest = os.path.join(target_dir, f"{f['digest'][:8]}_{f['filename']}")
+                self._link(self.blob_path(f["digest"]), dest)
+                paths.append(dest)
+                self._touch(self.blob_path(f["digest"]))
+        except FileNotFoundError:
+            # blob was swept underneath the index entry
+            for p in paths:
+                os.remove(p)
+            return None
+        logger.info("Serving %s from blob store", key)
+        return paths if entry["multi"] else paths[0]
+
+    def entry_age(self, key: str) -> Optional[float]:
+        """Seconds since key was last stored, or None if it isn't indexed."""
+        entry = self._read_entry(self._index_path(key))
+        return time.time() - entry["created"] if entry else None
+
+    def usage_bytes(self) -> int:
+        total = 0
+        for dirpath, _, files in os.walk(self.blob_dir):
+            for f in files:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, f))
+                except OSError:
+                    pass
+        return total
+
+    def sweep(self) -> int:
+        """Delete expired index entries and blobs with no links and no live index entry, then
+        evict unlinked blobs least recently used first while over max_bytes. Returns blobs removed."""
+        now = time.time()
+        wanted = set()
+        for name in os.listdir(self.index_dir):
+            p = os.path.join(self.index_dir, name)
+            entry = self._read_entry(p) if name.endswith(".json") else None
+            if entry and now - entry["created"] <= self.ttl_seconds:
+                wanted.update(f["digest"] for f in entry["files"])
+                continue
+            # expired, unreadable or a stale tmp file
+            try:
+                if now - os.path.getmtime(p) > SWEEP_GRACE_SECONDS:
+                    os.remove(p)
+            except OSError:
+                pass
+
+        removed = 0
+        usage = 0
+        evictable = []  # (mtime, size, path) of unlinked blobs kept only for the index
+        for shard in os.listdir(self.blob_dir):
+            shard_dir = os.path.join(self.blob_dir, shard)
+            for digest in os.listdir(shard_dir):
+                p = os.path.join(shard_dir, digest)
+                try:
+                    st = os.stat(p)
+                    unlinked = st.st_nlink <= 1 and now - st.st_mtime > SWEEP_GRACE_SECONDS
+                    if unlinked and digest not in wanted:
+                        os.remove(p)
+                        removed += 1
+                        continue
+                except OSError:
+                    continue
+                usage += st.st_size
+                if unlinked:
+                    evictable.append((st.st_mtime, st.st_size, p))
+
+        if self.max_bytes is not None and usage > self.max_bytes:
+            for _mtime, size, p in sorted(evictable):
+                if usage <= self.max_bytes:
+                    break
+                try:
+                    os.remove(p)
+                except OSError:
+                    continue
+                usage -= size
+                removed += 1
+        return removed
@@ -0,0 +1,120 @@
+# httpclient.py
+# Shared pooled HTTP client for the service's own side fetches (oEmbed, og: meta scraping, trace export).
+# Media bytes are still fetched by yt-dlp / instaloader / spotdl.
+import os
+import re
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("media-downloader")
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+# Per-host cap so one slow site can't take the whole pool
+HTTP_MAX_PER_HOST = int(os.environ.get("HTTP_MAX_PER_HOST", "10"))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "60"))
+# Stop scanning an HTML page for <meta> tags after this many bytes
+META_SCAN_MAX_BYTES = 512 * 1024
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36'
+
+_client = None
+_client_lock = threading.Lock()
+_host_slots = {}  # host -> BoundedSemaphore
+
+
+def get_client():
+    """Process-wide httpx.Client (thread-safe); created on first use so importing this module stays cheap."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                try:
+                    import h2  # noqa: F401  httpx only negotiates HTTP/2 when h2 is installed
+                    http2 = True
+                except ImportError:
+                    http2 = False
+                _client = httpx.Client(
+                    http2=http2,
+                    follow_redirects=True,
+                    timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS),
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                    ),
+                    headers={"User-Agent": USER_AGENT},
+                )
+    return _client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+@contextmanager
+def _host_slot(url: str):
+    host = urlsplit(url).netloc.lower()
+    with _client_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(HTTP_MAX_PER_HOST)
+    with slot:
+        yield
+
+
+def fetch_json(url: str, params: Optional[dict] = None):
+    with _host_slot(url):
+        r = get_client().get(url, params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+def post_json(url: str, body: str, timeout: Optional[float] = None):
+    with _host_slot(url):
+        r = get_client().post(url, content=body.encode("utf-8"),
+                              headers={"Content-Type": "application/json"},
+                              timeout=timeout or HTTP_TIMEOUT_SECONDS)
+    r.raise_for_status()
+    return r
+
+
+def find_meta(url: str, patterns, headers: Optional[dict] = None) -> Optional[str]:
+    """Stream an HTML page and return group(1) of the first matching pattern, in preference order.
+
+    Reading stops as soon as the preferred pattern matches, or at </head>, so the
+    body of the page is usually never downloaded.
+    """
+    patterns = [re.compile(p) if isinstance(p, str) else p for p in patterns]
+    buf = ""
+    with _host_slot(url), get_client().stream("GET", url, headers=headers) as r:
+        r.raise_for_status()
+        start = 0
+        for chunk in r.iter_text():
+            buf += chunk
+            m = patterns[0].search(buf, start)
+            if m:
+                return m.group(1)
+            if "</head>" in buf[start:].lower() or len(buf) >= META_SCAN_MAX_BYTES:
+                break
+            # next time resume at the last tag that may still be incomplete, however long it is
+            # (signed CDN URLs in og:video easily exceed a few KB); else just before the end
+            # in case "<meta" or "</head>" itself was split
+            last_tag = buf.rfind("<meta", start)
+            if last_tag != -1 and ">" not in buf[last_tag:]:
+                start = last_tag
+            else:
+                start = max(start, len(buf) - len("</head>"))
+    for p in patterns[1:]:
+        m = p.search(buf)
+        if m:
+            return m.group(1)
+    return None
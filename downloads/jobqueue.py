@@ -0,0 +1,403 @@
+# jobqueue.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional
+
+logger = logging.getLogger("media-downloader")
+
+# How long a worker may hold a job without heartbeating before it is requeued
+DEFAULT_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+# Jobs whose worker crashed this many times are marked failed instead of requeued
+MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# How long finished (done/failed) jobs stay readable by the API in the redis backend
+FINISHED_JOB_TTL_SECONDS = int(os.environ.get("JOB_RESULT_TTL_SECONDS", "3600"))
+# A claimed id still without a lease after this long belongs to a worker that died mid-claim
+ORPHAN_GRACE_SECONDS = 30
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue(ABC):
+    """Interface shared by queue backends. Payloads and results are JSON-serializable dicts."""
+
+    @abstractmethod
+    def enqueue(self, payload: dict, low_priority: bool = False) -> str:
+        """Add a job. Low-priority jobs (prefetch) are only claimed when no normal job is queued."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[dict]:
+        """Take the oldest queued job (normal priority first) and lease it to worker_id. Returns None when idle."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend the lease. Returns False if the job no longer belongs to worker_id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def requeue_expired(self) -> int:
+        """Put jobs with lapsed leases back on the queue (or fail them after MAX_ATTEMPTS)."""
+        raise NotImplementedError
+
+    # Shared file registry so any API node can serve files produced by any worker
+    @abstractmethod
+    def publish_file(self, file_id: str, path: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lookup_file(self, file_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def drop_file(self, file_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire_files(self, max_age_seconds: float) -> list:
+        """Remove registry entries older than max_age_seconds and return their paths."""
+        raise NotImplementedError
+
+
+# ----------------- SQLite backend (single host) -----------------
+class SQLiteJobQueue(JobQueue):
+    """Queue stored in a SQLite file; safe across processes on one host (WAL mode)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL,"
+                " priority INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            c.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, priority, created)")
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " file_id TEXT PRIMARY KEY, path TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit mode; explicit BEGIN IMMEDIATE where we need atomic claim
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload: dict, low_priority: bool = False) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, payload, status, priority, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), QUEUED, 1 if low_priority else 0, now, now),
+        )
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[dict]:
+        c = self._conn()
+        now = time.time()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY priority, created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                c.execute("COMMIT")
+                return None
+            c.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ?"
+                " WHERE id = ?",
+                (RUNNING, worker_id, now + lease_seconds, now, row["id"]),
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND status = ?",
+            (now + lease_seconds, now, job_id, worker_id, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, lease_until = NULL, updated = ? WHERE id = ? AND worker = ?",
+            (DONE, json.dumps(result), time.time(), job_id, worker_id),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated = ? WHERE id = ? AND worker = ?",
+            (FAILED, error, time.time(), job_id, worker_id),
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "payload": json.loads(row["payload"]),
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "worker": row["worker"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+
+    def requeue_expired(self) -> int:
+        c = self._conn()
+        now = time.time()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute(
+                "UPDATE jobs SET status = ?, error = 'worker lease expired', worker = NULL, lease_until = NULL, updated = ?"
+                " WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now, MAX_ATTEMPTS),
+            )
+            cur = c.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL, updated = ?"
+                " WHERE status = ? AND lease_until < ?",
+                (QUEUED, now, RUNNING, now),
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def publish_file(self, file_id: str, path: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO files (file_id, path, created) VALUES (?, ?, ?)",
+            (file_id, path, time.time()),
+        )
+
+    def lookup_file(self, file_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT path FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return row["path"] if row else None
+
+    def drop_file(self, file_id: str):
+        self._conn().execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+    def expire_files(self, max_age_seconds: float) -> list:
+        c = self._conn()
+        cutoff = time.time() - max_age_seconds
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            rows = c.execute("SELECT path FROM files WHERE created < ?", (cutoff,)).fetchall()
+            c.execute("DELETE FROM files WHERE created < ?", (cutoff,))
+            # finished jobs are only needed until their caller has picked up the result
+            c.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (DONE, FAILED, cutoff))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return [r["path"] for r in rows]
+
+
+# ----------------- Redis backend (multi host) -----------------
+def _s(v):
+    # redis clients return bytes unless decode_responses=True
+    return v.decode("utf-8") if isinstance(v, bytes) else v
+
+
+class RedisJobQueue(JobQueue):
+    """Queue on any client exposing the redis-py command subset used below
+    (lpush, rpoplpush, lrange, lrem, hset, hget, hgetall, hincrby, hdel, expire,
+    zadd, zrem, zscore, zrangebyscore). A local stand-in object with those methods works too."""
+
+    def __init__(self, client, prefix: str = "umd"):
+        self.r = client
+        self.prefix = prefix
+        self.k_queue = f"{prefix}:queue"
+        self.k_queue_low = f"{prefix}:queue:low"
+        self.k_processing = f"{prefix}:processing"
+        self.k_leases = f"{prefix}:leases"
+        self.k_orphans = f"{prefix}:orphans"  # processing ids seen without a lease -> first seen
+        self.k_files = f"{prefix}:files"
+        self.k_files_created = f"{prefix}:files:created"
+
+    def _k_job(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def enqueue(self, payload: dict, low_priority: bool = False) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self.r.hset(self._k_job(job_id), mapping={
+            "id": job_id, "payload": json.dumps(payload), "status": QUEUED,
+            "attempts": 0, "low": int(low_priority), "created": now, "updated": now,
+        })
+        self.r.lpush(self.k_queue_low if low_priority else self.k_queue, job_id)
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> Optional[dict]:
+        # rpoplpush keeps the id in the processing list; if we die before the lease is
+        # written, requeue_expired() adopts it as an orphan after ORPHAN_GRACE_SECONDS
+        job_id = _s(self.r.rpoplpush(self.k_queue, self.k_processing))
+        if not job_id:
+            job_id = _s(self.r.rpoplpush(self.k_queue_low, self.k_processing))
+        if not job_id:
+            return None
+        now = time.time()
+        self.r.zadd(self.k_leases, {job_id: now + lease_seconds})
+        self.r.hincrby(self._k_job(job_id), "attempts", 1)
+        self.r.hset(self._k_job(job_id), mapping={"status": RUNNING, "worker": worker_id, "updated": now})
+        return self.get(job_id)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+        key = self._k_job(job_id)
+        if _s(self.r.hget(key, "worker")) != worker_id or _s(self.r.hget(key, "status")) != RUNNING:
+            return False
+        now = time.time()
+        self.r.zadd(self.k_leases, {job_id: now + lease_seconds})
+        self.r.hset(key, "updated", now)
+        return True
+
+    def _finish(self, job_id: str, worker_id: str, fields: dict):
+        key = self._k_job(job_id)
+        if _s(self.r.hget(key, "worker")) != worker_id:
+            return
+        fields["updated"] = time.time()
+        self.r.hset(key, mapping=fields)
+        self.r.expire(key, FINISHED_JOB_TTL_SECONDS)
+        self.r.zrem(self.k_leases, job_id)
+        self.r.zrem(self.k_orphans, job_id)
+        self.r.lrem(self.k_processing, 0, job_id)
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        self._finish(job_id, worker_id, {"status": DONE, "result": json.dumps(result)})
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        self._finish(job_id, worker_id, {"status": FAILED, "error": error})
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raw = self.r.hgetall(self._k_job(job_id))
+        if not raw:
+            return None
+        h = {_s(k): _s(v) for k, v in raw.items()}
+        return {
+            "id": h.get("id", job_id),
+            "payload": json.loads(h.get("payload") or "{}"),
+            "status": h.get("status"),
+            "attempts": int(h.get("attempts") or 0),
+            "worker": h.get("worker"),
+            "result": json.loads(h["result"]) if h.get("result") else None,
+            "error": h.get("error"),
+        }
+
+    def requeue_expired(self) -> int:
+        requeued = 0
+        for raw_id in self.r.zrangebyscore(self.k_leases, 0, time.time()):
+            job_id = _s(raw_id)
+            # zrem acts as the lock: only one node gets to requeue a given job
+            if not self.r.zrem(self.k_leases, job_id):
+                continue
+            self.r.lrem(self.k_processing, 0, job_id)
+            key = self._k_job(job_id)
+            attempts = int(_s(self.r.hget(key, "attempts")) or 0)
+            if attempts >= MAX_ATTEMPTS:
+                self.r.hset(key, mapping={"status": FAILED, "error": "worker lease expired", "updated": time.time()})
+                self.r.expire(key, FINISHED_JOB_TTL_SECONDS)
+                continue
+            self._push_back(job_id)
+            requeued += 1
+        return requeued + self._requeue_orphans()
+
+    def _push_back(self, job_id: str):
+        key = self._k_job(job_id)
+        self.r.hset(key, mapping={"status": QUEUED, "updated": time.time()})
+        self.r.hdel(key, "worker")
+        low = _s(self.r.hget(key, "low")) == "1"
+        self.r.lpush(self.k_queue_low if low else self.k_queue, job_id)
+
+    def _requeue_orphans(self) -> int:
+        """Requeue ids left in the processing list by a worker that died between pop and lease."""
+        now = time.time()
+        requeued = 0
+        for raw_id in self.r.lrange(self.k_processing, 0, -1):
+            job_id = _s(raw_id)
+            if self.r.zscore(self.k_leases, job_id) is not None:
+                self.r.zrem(self.k_orphans, job_id)
+                continue
+            first_seen = self.r.zscore(self.k_orphans, job_id)
+            if first_seen is None:
+                self.r.zadd(self.k_orphans, {job_id: now})
+                continue
+            if now - float(first_seen) < ORPHAN_GRACE_SECONDS:
+                continue
+            # zrem/lrem act as the lock: only one node gets to requeue a given orphan
+            if not self.r.zrem(self.k_orphans, job_id) or not self.r.lrem(self.k_processing, 0, job_id):
+                continue
+            self._push_back(job_id)
+            requeued += 1
+        return requeued
+
+    def publish_file(self, file_id: str, path: str):
+        self.r.hset(self.k_files, file_id, path)
+        self.r.zadd(self.k_files_created, {file_id: time.time()})
+
+    def lookup_file(self, file_id: str) -> Optional[str]:
+        return _s(self.r.hget(self.k_files, file_id))
+
+    def drop_file(self, file_id: str):
+        self.r.hdel(self.k_files, file_id)
+        self.r.zrem(self.k_files_created, file_id)
+
+    def expire_files(self, max_age_seconds: float) -> list:
+        paths = []
+        for raw_id in self.r.zrangebyscore(self.k_files_created, 0, time.time() - max_age_seconds):
+            file_id = _s(raw_id)
+            if not self.r.zrem(self.k_files_created, file_id):
+                continue
+            path = _s(self.r.hget(self.k_files, file_id))
+            self.r.hdel(self.k_files, file_id)
+            if path:
+                paths.append(path)
+        return paths
+
+
+def queue_from_url(url: str) -> JobQueue:
+    """Build a queue from JOB_QUEUE_URL: sqlite:///path/to/jobs.db or redis://host:port/db."""
+    if url.startswith("sqlite:///"):
+        return SQLiteJobQueue(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("JOB_QUEUE_URL uses redis but the 'redis' package is not installed")
+        return RedisJobQueue(redis.Redis.from_url(url), prefix=os.environ.get("JOB_QUEUE_PREFIX", "umd"))
+    raise ValueError(f"Unsupported JOB_QUEUE_URL: {url}")
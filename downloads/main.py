@@ -1,12 +1,17 @@
 # main.py
+import time
+# measured from here so /healthz can report cold-start latency of this instance
+_MODULE_IMPORT_STARTED = time.monotonic()
 import os
 import re
 import uuid
 import shutil
 import subprocess
 import asyncio
+import threading
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
@@ -15,11 +20,16 @@ import logging
 from dotenv import load_dotenv
 import os as _os
 
-# media libs
-import yt_dlp
-import instaloader
+# media libs (yt_dlp, instaloader) are imported inside the functions that use them:
+# yt-dlp builds its extractor table on import, which would delay every worker start.
 import zipfile
 
+from .jobqueue import queue_from_url, DONE, FAILED
+from . import tracing
+from . import httpclient
+from .blobstore import BlobStore
+from .prefetch import SharedPrefetchState
+
 # ---------- Config ----------
 DOWNLOAD_ROOT = os.path.join(os.getcwd(), "downloads")
 os.makedirs(DOWNLOAD_ROOT, exist_ok=True)
@@ -32,11 +42,45 @@ if os.path.exists(root_env):
 # API key via env var, fallback to a generated one (printed at startup)
 API_KEY = os.environ.get("API_KEY") or str(uuid.uuid4())
 PRINT_API_KEY = os.environ.get("PRINT_API_KEY", "1")
+# Comma-separated keys that may also request debug traces/profiles on /download
+ADMIN_API_KEYS = {k.strip() for k in os.environ.get("ADMIN_API_KEYS", "").split(",") if k.strip()}
 
 # TTL for files and cleanup interval
 FILE_TTL = timedelta(hours=1)
 CLEANUP_INTERVAL_SECONDS = 600
 
+# Optional distributed mode: API nodes enqueue jobs and `python -m downloads.worker`
+# processes run them. Files go to DOWNLOAD_ROOT, which must be shared storage then.
+JOB_QUEUE_URL = os.environ.get("JOB_QUEUE_URL")
+JOB_WAIT_SECONDS = float(os.environ.get("JOB_WAIT_SECONDS", "300"))
+JOB_POLL_INTERVAL_SECONDS = 0.5
+JOB_QUEUE = queue_from_url(JOB_QUEUE_URL) if JOB_QUEUE_URL else None
+
+# Content-addressed store: identical files from different URLs/tasks are kept once and
+# hardlinked into task dirs; repeat requests for the same canonical URL skip the download.
+DEDUP_STORE = os.environ.get("DEDUP_STORE", "1") == "1"
+# Served files stay in the store for cache hits until FILE_TTL; the cleanup sweep evicts
+# the least recently used ones first whenever the store grows past this size
+BLOB_STORE_MAX_BYTES = int(float(os.environ.get("BLOB_STORE_MAX_MB", "4096")) * 1024 * 1024)
+BLOB_STORE = BlobStore(os.path.join(DOWNLOAD_ROOT, ".blobs"), FILE_TTL.total_seconds(),
+                       max_bytes=BLOB_STORE_MAX_BYTES) if DEDUP_STORE else None
+
+# Popularity prefetch: keep the most requested links (and an admin watchlist) fresh in the
+# blob store so their next request is a cache hit. Needs DEDUP_STORE.
+PREFETCH = os.environ.get("PREFETCH", "0") == "1" and DEDUP_STORE
+PREFETCH_WINDOW_SECONDS = int(os.environ.get("PREFETCH_WINDOW_SECONDS", "3600"))
+PREFETCH_INTERVAL_SECONDS = int(os.environ.get("PREFETCH_INTERVAL_SECONDS", "120"))
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", "20"))
+PREFETCH_MIN_REQUESTS = int(os.environ.get("PREFETCH_MIN_REQUESTS", "3"))
+# Refresh entries this long before their index entry would expire (FILE_TTL)
+PREFETCH_REFRESH_MARGIN_SECONDS = int(os.environ.get("PREFETCH_REFRESH_MARGIN_SECONDS", "600"))
+# Stop prefetching while the blob store is above this size
+PREFETCH_DISK_BUDGET_BYTES = int(float(os.environ.get("PREFETCH_DISK_BUDGET_MB", "2048")) * 1024 * 1024)
+
+# Optional warm-up: load media libs, build extractors and log into Instagram before
+# /healthz reports ready. Off by default so instances answer health checks immediately.
+WARMUP = os.environ.get("WARMUP", "0") == "1"
+
 # Allowed CORS origins (set to '*' or specific frontends)
 CORS_ALLOW_ORIGINS = os.environ.get("CORS_ALLOW_ORIGINS", "*").split(",") if os.environ.get("CORS_ALLOW_ORIGINS") else ["*"]
 
@@ -60,15 +104,24 @@ class DownloadRequest(BaseModel):
     platform: Optional[str] = None  # instagram | youtube | spotify | x
     media_type: Optional[str] = None  # audio | video
     filename: Optional[str] = None  # desired filename without extension
+    debug: Optional[bool] = False  # admin keys only: record a trace of this request
+    profile: Optional[bool] = False  # admin keys only: also dump cProfile stats (implies debug)
+
+class WatchlistRequest(BaseModel):
+    urls: List[str]
+    media_type: Optional[str] = None  # audio | video (youtube only)
 
 # File registry
 FILE_REGISTRY = {}  # file_id -> {"path": str, "created": datetime}
 
 # ----------------- Helpers -----------------
 def validate_api_key(x_api_key: str = Header(None)):
-    if not x_api_key or x_api_key != API_KEY:
+    if not x_api_key or (x_api_key != API_KEY and x_api_key not in ADMIN_API_KEYS):
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
 
+def is_admin_key(x_api_key: Optional[str]) -> bool:
+    return bool(x_api_key) and x_api_key in ADMIN_API_KEYS
+
 def detect_platform(url: str) -> str:
     u = url.lower()
     if "instagram.com" in u:
@@ -81,6 +134,27 @@ def detect_platform(url: str) -> str:
         return "x"
     raise ValueError("Could not detect platform from URL")
 
+def canonical_url(platform: str, url: str) -> str:
+    """Collapse the different link forms of one item (youtu.be vs watch?v=, tracking params, ...)."""
+    patterns = {
+        "youtube": r"(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})",
+        "instagram": r"(?:/p/|/reel/|/reels/|/tv/)([A-Za-z0-9_-]+)",
+        "spotify": r"spotify\.com/(?:intl-[a-z]+/)?((?:track|album|playlist|episode)/[A-Za-z0-9]+)",
+        "x": r"/status(?:es)?/(\d+)",
+    }
+    platform = "x" if platform == "twitter" else platform
+    m = re.search(patterns[platform], url) if platform in patterns else None
+    if m:
+        return f"{platform}:{m.group(1)}"
+    # unknown link form: query and case may well identify the item (playlists, clips, ...)
+    return url.strip().split("#")[0]
+
+def cache_key(platform: str, url: str, media_type: Optional[str] = None) -> str:
+    key = canonical_url(platform, url)
+    if platform == "youtube":
+        key += "|" + (media_type if media_type in ("audio", "video") else "video")
+    return key
+
 def sanitize_filename(name: str) -> str:
     # basic sanitization and trimming
     name = re.sub(r'[\\/:"*?<>|]+', "_", name).strip()
@@ -99,10 +173,15 @@ def register_file(path: str) -> str:
     return file_id
 
 def file_path_by_id(file_id: str) -> str:
+    """Path registered for file_id; may query the shared queue store, so call it off the event loop."""
     meta = FILE_REGISTRY.get(file_id)
-    if not meta:
+    if meta:
+        return meta["path"]
+    # files produced by workers are registered in the shared queue store
+    path = JOB_QUEUE.lookup_file(file_id) if JOB_QUEUE else None
+    if not path:
         raise HTTPException(status_code=404, detail="File not found")
-    return meta["path"]
+    return path
 
 async def cleanup_old_files_loop():
     while True:
@@ -121,6 +200,19 @@ async def cleanup_old_files_loop():
             except Exception as e:
                 logger.warning("Cleanup error removing %s: %s", path, e)
             FILE_REGISTRY.pop(fid, None)
+        if JOB_QUEUE:
+            try:
+                for path in await asyncio.to_thread(JOB_QUEUE.expire_files, FILE_TTL.total_seconds()):
+                    await asyncio.to_thread(_safe_remove_path, path)
+            except Exception:
+                logger.exception("Cleanup of shared job files failed")
+        if BLOB_STORE is not None:
+            try:
+                removed = await asyncio.to_thread(BLOB_STORE.sweep)
+                if removed:
+                    logger.info("Removed %s unreferenced blob(s)", removed)
+            except Exception:
+                logger.exception("Blob store sweep failed")
         await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
 
 
@@ -152,17 +244,89 @@ def schedule_remove(background: BackgroundTasks, path: str, file_id: Optional[st
                 _safe_remove_path(path)
             finally:
                 FILE_REGISTRY.pop(file_id, None)
+                if JOB_QUEUE:
+                    JOB_QUEUE.drop_file(file_id)
     else:
         def _remove_and_unreg():
             _safe_remove_path(path)
 
     background.add_task(_remove_and_unreg)
 
+# ----------------- Startup / readiness -----------------
+STARTUP_STATE = {
+    "ready": False,
+    "warmup": WARMUP,
+    "startup_seconds": None,  # module import -> startup event done
+    "warmup_seconds": None,
+    "ready_seconds": None,  # module import -> ready (includes warm-up)
+    "warmup_failed": False,  # details only in the log: /healthz is unauthenticated
+}
+
+# Instagram session cookies captured during warm-up, reused by download_instagram
+_WARM_INSTAGRAM_SESSION = None
+
+def warmup():
+    """Import heavy platform libraries and pre-initialize them. Blocking; run in a thread."""
+    global _WARM_INSTAGRAM_SESSION
+    import yt_dlp
+    import instaloader
+
+    # open the shared HTTP client so its pool exists before the first side fetch
+    httpclient.get_client()
+
+    # the instances die with this throwaway YoutubeDL; what carries over is that yt-dlp's
+    # extractor modules (and their lazy imports) are loaded before the first request
+    with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
+        for ie_key in ("Youtube", "Instagram", "Twitter"):
+            try:
+                ydl.get_info_extractor(ie_key)
+            except Exception:
+                logger.warning("Warm-up could not initialize extractor %s", ie_key)
+
+    if os.environ.get("INSTALOADER_USERNAME"):
+        L = instaloader.Instaloader(download_comments=False, save_metadata=False)
+        if instaloader_authenticate(L) and hasattr(L, "save_session"):
+            _WARM_INSTAGRAM_SESSION = L.save_session()
+
+async def run_warmup():
+    started = time.monotonic()
+    try:
+        await asyncio.to_thread(warmup)
+    except Exception:
+        logger.exception("Warm-up failed; serving anyway")
+        STARTUP_STATE["warmup_failed"] = True
+    STARTUP_STATE["warmup_seconds"] = round(time.monotonic() - started, 3)
+    mark_ready()
+
+def mark_ready():
+    STARTUP_STATE["ready"] = True
+    STARTUP_STATE["ready_seconds"] = round(time.monotonic() - _MODULE_IMPORT_STARTED, 3)
+    warm = STARTUP_STATE["warmup_seconds"]
+    logger.info("Instance ready: startup %.3fs, warm-up %s, total %.3fs",
+                STARTUP_STATE["startup_seconds"], f"{warm:.3f}s" if warm is not None else "off",
+                STARTUP_STATE["ready_seconds"])
+
 @app.on_event("startup")
 async def startup_event():
     if PRINT_API_KEY == "1":
         logger.info("API Key (use header 'x-api-key'): %s", API_KEY)
     asyncio.create_task(cleanup_old_files_loop())
+    if PREFETCH:
+        asyncio.create_task(prefetch_loop())
+    STARTUP_STATE["startup_seconds"] = round(time.monotonic() - _MODULE_IMPORT_STARTED, 3)
+    if WARMUP:
+        asyncio.create_task(run_warmup())
+    else:
+        mark_ready()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    httpclient.close_client()
+
+@app.get("/healthz")
+async def healthz():
+    """Unauthenticated readiness probe; 503 until warm-up (if enabled) has finished."""
+    return JSONResponse(status_code=200 if STARTUP_STATE["ready"] else 503, content=STARTUP_STATE)
 
 # ----------------- Download implementations -----------------
 def extract_instagram_shortcode(url: str) -> Optional[str]:
@@ -170,45 +334,71 @@ def extract_instagram_shortcode(url: str) -> Optional[str]:
     m = re.search(r"(?:/p/|/reel/|/reels/|/tv/)([A-Za-z0-9_-]+)", url)
     return m.group(1) if m else None
 
-def download_instagram(url: str, target_dir: str) -> str:
-    shortcode = extract_instagram_shortcode(url)
-    if not shortcode:
-        raise RuntimeError("Invalid Instagram URL (shortcode not found).")
-
-    # Normalize URL (strip query strings)
-    url = url.split('?')[0]
-
-    # Ensure Instaloader places files under target_dir/<shortcode>/ by using a dirname_pattern
-    # Instaloader uses the 'target' argument as a folder name under dirname_pattern.
-    L = instaloader.Instaloader(dirname_pattern=os.path.join(target_dir, '{target}'), download_comments=False, save_metadata=False)
-
-    # Optional authentication: use session file or username/password from env
+def instaloader_authenticate(L) -> bool:
+    """Optional authentication: reuse the warm-up session, else session file or username/password from env."""
     session_file = os.environ.get('INSTALOADER_SESSION_FILE')
     instaloader_user = os.environ.get('INSTALOADER_USERNAME')
     instaloader_pass = os.environ.get('INSTALOADER_PASSWORD')
     try:
+        if instaloader_user and _WARM_INSTAGRAM_SESSION is not None:
+            try:
+                L.load_session(instaloader_user, _WARM_INSTAGRAM_SESSION)
+                return True
+            except Exception:
+                logger.exception('Failed to reuse warm-up instaloader session')
         if instaloader_user and session_file and os.path.exists(session_file):
             # Preferred: load session via helper which accepts username and filename
             try:
                 L.load_session_from_file(instaloader_user, session_file)
                 logger.info('Loaded instaloader session from %s for user %s', session_file, instaloader_user)
+                return True
             except Exception:
                 # Some older/newer Instaloader versions require a file-like object
                 try:
                     with open(session_file, 'rb') as sf:
                         L.context.load_session_from_file(instaloader_user, sf)
                     logger.info('Loaded instaloader session (file-like) from %s for user %s', session_file, instaloader_user)
+                    return True
                 except Exception:
                     logger.exception('Failed to load instaloader session from %s', session_file)
         elif instaloader_user and instaloader_pass:
             logger.info('Logging into Instagram as %s', instaloader_user)
             L.login(instaloader_user, instaloader_pass)
+            return True
     except Exception:
         logger.exception('Instaloader authentication failed; continuing without auth')
+    return False
+
+# og:video preferred over og:video:secure_url
+OG_VIDEO_PATTERNS = (
+    re.compile(r'<meta\s+property="og:video"\s+content="([^"]+)"'),
+    re.compile(r'<meta\s+property="og:video:secure_url"\s+content="([^"]+)"'),
+)
+
+def download_instagram(url: str, target_dir: str) -> str:
+    import yt_dlp
+    import instaloader
+
+    shortcode = extract_instagram_shortcode(url)
+    if not shortcode:
+        raise RuntimeError("Invalid Instagram URL (shortcode not found).")
+
+    # Normalize URL (strip query strings)
+    url = url.split('?')[0]
+
+    # Ensure Instaloader places files under target_dir/<shortcode>/ by using a dirname_pattern
+    # Instaloader uses the 'target' argument as a folder name under dirname_pattern.
+    L = instaloader.Instaloader(dirname_pattern=os.path.join(target_dir, '{target}'), download_comments=False, save_metadata=False)
+
+    session_file = os.environ.get('INSTALOADER_SESSION_FILE')
+    instaloader_user = os.environ.get('INSTALOADER_USERNAME')
+    instaloader_authenticate(L)
 
     # Download the post into target_dir/<shortcode>/
-    post = instaloader.Post.from_shortcode(L.context, shortcode)
-    L.download_post(post, target=shortcode)
+    with tracing.span("extract", source="instaloader"):
+        post = instaloader.Post.from_shortcode(L.context, shortcode)
+    with tracing.span("download", source="instaloader"):
+        L.download_post(post, target=shortcode)
 
     post_folder = os.path.join(target_dir, shortcode)
     if os.path.isdir(post_folder):
@@ -296,7 +486,7 @@ def download_instagram(url: str, target_dir: str) -> str:
             # try multiple attempts
             for attempt in range(2):
                 try:
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    with tracing.ytdl_phases(ydl_opts) as opts, yt_dlp.YoutubeDL(opts) as ydl:
                         ydl.extract_info(url, download=True)
                     # Check for downloaded video files
                     files = [f for f in os.listdir(target_dir) if f.lower().endswith(('.mp4', '.webm', '.mkv'))]
@@ -321,12 +511,9 @@ def download_instagram(url: str, target_dir: str) -> str:
             # If no video found, try extracting direct video URL from page meta tags (og:video)
             logger.info('No video file found after yt-dlp. Attempting to parse page for og:video...')
             try:
-                import urllib.request
-                resp = urllib.request.urlopen(url, timeout=10)
-                html = resp.read().decode('utf-8', errors='ignore')
-                m = re.search(r'<meta\s+property="og:video"\s+content="([^"]+)"', html) or re.search(r'<meta\s+property="og:video:secure_url"\s+content="([^"]+)"', html)
-                if m:
-                    video_url = m.group(1)
+                with tracing.span("og_video_scrape"):
+                    video_url = httpclient.find_meta(url, OG_VIDEO_PATTERNS)
+                if video_url:
                     logger.info('Found og:video URL, downloading direct media: %s', video_url)
                     ydl_opts2 = {
                         'outtmpl': os.path.join(target_dir, '%(title)s.%(ext)s'),
@@ -335,7 +522,7 @@ def download_instagram(url: str, target_dir: str) -> str:
                         'quiet': True,
                         'noplaylist': True,
                     }
-                    with yt_dlp.YoutubeDL(ydl_opts2) as ydl2:
+                    with tracing.ytdl_phases(ydl_opts2) as ydl_opts2, yt_dlp.YoutubeDL(ydl_opts2) as ydl2:
                         ydl2.extract_info(video_url, download=True)
 
                     files2 = [f for f in os.listdir(target_dir) if f.lower().endswith(('.mp4', '.webm', '.mkv'))]
@@ -423,6 +610,8 @@ def download_instagram(url: str, target_dir: str) -> str:
         raise RuntimeError("No media files found after instaloader.")
 
 def download_yt(url: str, target_dir: str, media_type: str = "video") -> str:
+    import yt_dlp
+
     outtmpl = os.path.join(target_dir, "%(title)s.%(ext)s")
     if media_type == "audio":
         ydl_opts = {
@@ -440,7 +629,7 @@ def download_yt(url: str, target_dir: str, media_type: str = "video") -> str:
             "quiet": True,
             "noplaylist": True,
         }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    with tracing.ytdl_phases(ydl_opts) as ydl_opts, yt_dlp.YoutubeDL(ydl_opts) as ydl:
         info = ydl.extract_info(url, download=True)
         filepath = ydl.prepare_filename(info)
         if media_type == "audio":
@@ -457,7 +646,8 @@ def download_spotify(url: str, target_dir: str, enforce_mp3: bool = True) -> str
     if enforce_mp3:
         cmd += ["--format", "mp3"]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    with tracing.span("spotdl"):
+        result = subprocess.run(cmd, capture_output=True, text=True)
     logger.info("spotdl stdout: %s", result.stdout)
     logger.info("spotdl stderr: %s", result.stderr)
 
@@ -472,15 +662,12 @@ def download_spotify(url: str, target_dir: str, enforce_mp3: bool = True) -> str
 
     # Fallback: Try to resolve song metadata from Spotify and search YouTube
     try:
-        import json
-        import urllib.request
+        import yt_dlp
 
         logger.info("Attempting Spotify -> YouTube fallback for URL: %s", url)
         # Use Spotify oEmbed or simple scraping for title/artist
-        oembed_api = f"https://open.spotify.com/oembed?url={urllib.parse.quote(url, safe='') }"
-        with urllib.request.urlopen(oembed_api, timeout=10) as r:
-            raw = r.read().decode('utf-8')
-            meta = json.loads(raw)
+        with tracing.span("oembed"):
+            meta = httpclient.fetch_json("https://open.spotify.com/oembed", params={"url": url})
         title = meta.get('title') or ''
         # title from oEmbed is usually like "Track Name - Artist"
         query = title or url
@@ -498,7 +685,7 @@ def download_spotify(url: str, target_dir: str, enforce_mp3: bool = True) -> str
             'socket_timeout': 10,
         }
         try:
-            with yt_dlp.YoutubeDL(search_opts) as ydl:
+            with tracing.span("search", query=query), yt_dlp.YoutubeDL(search_opts) as ydl:
                 logger.info('Searching YouTube for query: %s', query)
                 info = ydl.extract_info(search_query, download=False)
 
@@ -539,7 +726,7 @@ def download_spotify(url: str, target_dir: str, enforce_mp3: bool = True) -> str
 
                     try:
                         logger.info('Attempting candidate %s (video %s) with format %s', idx + 1, video_url, fmt)
-                        with yt_dlp.YoutubeDL(opts) as ydl2:
+                        with tracing.ytdl_phases(opts) as opts, yt_dlp.YoutubeDL(opts) as ydl2:
                             ydl2.extract_info(video_url, download=True)
 
                         # After download, scan target_dir for audio files
@@ -566,11 +753,201 @@ def download_spotify(url: str, target_dir: str, enforce_mp3: bool = True) -> str
     # If we reach this point, both spotdl and fallback failed
     raise RuntimeError('spotdl completed but no audio files found.')
 
+SUPPORTED_PLATFORMS = ("instagram", "youtube", "x", "twitter", "spotify")
+
+def run_download(platform: str, url: str, target_dir: str, media_type: Optional[str] = None, use_cache: bool = True):
+    """Dispatch to the platform downloader. Instagram may return a list of paths."""
+    with tracing.profiling(), tracing.span("platform_download", platform=platform):
+        if BLOB_STORE is None:
+            return _run_download(platform, url, target_dir, media_type)
+        key = cache_key(platform, url, media_type)
+        cached = BLOB_STORE.lookup(key, target_dir) if use_cache else None
+        if cached is not None:
+            return cached
+        result = _run_download(platform, url, target_dir, media_type)
+        with tracing.span("dedup_store"):
+            return BLOB_STORE.ingest(key, result)
+
+def _run_download(platform: str, url: str, target_dir: str, media_type: Optional[str] = None):
+    if platform == "instagram":
+        return download_instagram(url, target_dir)
+    if platform == "youtube":
+        mt = media_type if media_type in ("audio", "video") else "video"
+        return download_yt(url, target_dir, media_type=mt)
+    if platform in ("x", "twitter"):
+        return download_x(url, target_dir)
+    if platform == "spotify":
+        return download_spotify(url, target_dir, enforce_mp3=True)
+    raise ValueError(f"Unsupported platform: {platform}")
+
+def apply_desired_name(filepath: str, desired_name: Optional[str]) -> str:
+    """Rename filepath to desired_name (extension preserved); returns the final path."""
+    if not desired_name:
+        return filepath
+    with tracing.span("rename"):
+        return _rename(filepath, desired_name)
+
+def _rename(filepath: str, desired_name: str) -> str:
+    safe_name = sanitize_filename(desired_name)
+    ext = os.path.splitext(filepath)[1] or ""
+    newpath = os.path.join(os.path.dirname(filepath), safe_name + ext)
+    # if target exists, append uuid short
+    if os.path.exists(newpath):
+        newpath = os.path.join(os.path.dirname(filepath), f"{safe_name}_{str(uuid.uuid4())[:8]}{ext}")
+    os.rename(filepath, newpath)
+    return newpath
+
+def build_download_response(platform: str, filepaths, desired_name: Optional[str], register=register_file) -> dict:
+    """Rename and register downloaded files and build the POST /download response body."""
+    # If instagram returned multiple file paths, register each and return ordered list
+    if platform == "instagram":
+        if not isinstance(filepaths, (list, tuple)):
+            filepaths = [filepaths]
+        out_entries = []
+        for idx, fp in enumerate(filepaths):
+            # apply desired_name only to the first file (if provided)
+            if idx == 0:
+                fp = apply_desired_name(fp, desired_name)
+            with tracing.span("registry"):
+                file_id = register(fp)
+            out_entries.append({
+                "file_id": file_id,
+                "download_url": f"/files/{file_id}",
+                "filename": os.path.basename(fp)
+            })
+        return {"status": "ok", "files": out_entries}
+
+    # non-instagram (single file) flow
+    filepath = filepaths if not isinstance(filepaths, (list, tuple)) else filepaths[0]
+    filepath = apply_desired_name(filepath, desired_name)
+    with tracing.span("registry"):
+        file_id = register(filepath)
+    return {
+        "status": "ok",
+        "file_id": file_id,
+        "download_url": f"/files/{file_id}",
+        "filename": os.path.basename(filepath)
+    }
+
+async def wait_for_job(job_id: str) -> Optional[dict]:
+    """Poll the shared queue until the job finishes or JOB_WAIT_SECONDS elapses."""
+    deadline = asyncio.get_running_loop().time() + JOB_WAIT_SECONDS
+    while True:
+        job = await asyncio.to_thread(JOB_QUEUE.get, job_id)
+        if job and job["status"] in (DONE, FAILED):
+            return job
+        if asyncio.get_running_loop().time() >= deadline:
+            return job
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+def job_status_content(job: dict) -> dict:
+    return {"status": job["status"], "job_id": job["id"], "status_url": f"/jobs/{job['id']}"}
+
+# ----------------- Prefetch -----------------
+# Watchlist (managed via /admin/prefetch), request counts, in-flight user downloads and
+# pending markers, shared with the other API processes through files next to the blob store; only kept with PREFETCH=1
+PREFETCH_STATE = SharedPrefetchState(os.path.join(DOWNLOAD_ROOT, ".blobs", "prefetch"),
+                                     PREFETCH_WINDOW_SECONDS) if PREFETCH else None
+# One niced thread so prefetch never competes with user downloads for more than a core
+_prefetch_executor = None
+
+def run_user_download(platform: str, url: str, target_dir: str, media_type: Optional[str] = None):
+    """run_download for a request; while any runs, in any API process, no new prefetch starts."""
+    if PREFETCH_STATE is None:
+        return run_download(platform, url, target_dir, media_type)
+    PREFETCH_STATE.download_started()
+    try:
+        return run_download(platform, url, target_dir, media_type)
+    finally:
+        PREFETCH_STATE.download_finished()
+
+def note_request(platform: str, url: str, media_type: Optional[str]):
+    if PREFETCH_STATE is None:
+        return
+    PREFETCH_STATE.record(cache_key(platform, url, media_type), {"url": url, "platform": platform, "media_type": media_type})
+
+def _lower_thread_priority():
+    try:
+        # Linux applies setpriority to the calling thread when given its native id
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+def prefetch_one(request: dict):
+    """Download request into the blob store, bypassing the cache, and drop the task copy."""
+    task_dir = make_task_dir()
+    try:
+        run_download(request["platform"], request["url"], task_dir, request.get("media_type"), use_cache=False)
+    finally:
+        shutil.rmtree(task_dir, ignore_errors=True)
+
+def prefetch_candidates() -> list:
+    """Watchlist first, then the hottest keys in the window; [(key, request)] without duplicates."""
+    out = PREFETCH_STATE.watchlist()
+    for key, _count, request in PREFETCH_STATE.top(PREFETCH_TOP_N, PREFETCH_MIN_REQUESTS):
+        out.setdefault(key, request)
+    return list(out.items())
+
+async def run_prefetch_round():
+    global _prefetch_executor
+    refresh_after = FILE_TTL.total_seconds() - PREFETCH_REFRESH_MARGIN_SECONDS
+    for key, request in await asyncio.to_thread(prefetch_candidates):
+        age = await asyncio.to_thread(BLOB_STORE.entry_age, key)
+        if age is not None and age < refresh_after:
+            continue
+        if await asyncio.to_thread(BLOB_STORE.usage_bytes) >= PREFETCH_DISK_BUDGET_BYTES:
+            logger.info("Prefetch paused: blob store is over its %s byte budget", PREFETCH_DISK_BUDGET_BYTES)
+            return
+        if JOB_QUEUE:
+            # workers take low-priority jobs only when no user job is queued
+            if not await asyncio.to_thread(PREFETCH_STATE.claim_pending, key, PREFETCH_INTERVAL_SECONDS * 5):
+                continue
+            await asyncio.to_thread(JOB_QUEUE.enqueue, dict(request, prefetch=True), True)
+            continue
+        # user downloads run in threads, so this round keeps going while they do
+        if await asyncio.to_thread(PREFETCH_STATE.downloads_in_flight, PREFETCH_INTERVAL_SECONDS * 3):
+            return
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch",
+                                                    initializer=_lower_thread_priority)
+        logger.info("Prefetching %s", key)
+        try:
+            await asyncio.get_running_loop().run_in_executor(_prefetch_executor, prefetch_one, request)
+        except Exception:
+            logger.exception("Prefetch of %s failed", key)
+
+async def prefetch_loop():
+    while True:
+        await asyncio.sleep(PREFETCH_INTERVAL_SECONDS)
+        try:
+            # every API process publishes its request counts; one elected process prefetches
+            await asyncio.to_thread(PREFETCH_STATE.flush)
+            if await asyncio.to_thread(PREFETCH_STATE.try_lead):
+                await run_prefetch_round()
+        except Exception:
+            logger.exception("Prefetch round failed")
+
 # ----------------- Main API -----------------
 @app.post("/download")
 async def download_endpoint(req: DownloadRequest, x_api_key: str = Header(None)):
     validate_api_key(x_api_key)
 
+    debug = bool(req.debug or req.profile)
+    if debug and not is_admin_key(x_api_key):
+        raise HTTPException(status_code=403, detail="debug and profile require an admin API key")
+    sampled = not debug and tracing.should_sample()
+    profile = bool(req.profile) or (sampled and tracing.TRACE_PROFILE_SAMPLED)
+
+    # the profile itself is taken around run_download, i.e. on the queue worker in queue mode
+    with tracing.traced("POST /download", enabled=debug or sampled, profile=profile, url=req.url) as trace:
+        status_code, content = await handle_download(req, trace)
+        with tracing.span("response"):
+            if trace is not None and debug:
+                content = dict(content, trace_id=trace.trace_id)
+            return JSONResponse(status_code=status_code, content=content)
+
+async def handle_download(req: DownloadRequest, trace=None):
+    """Run (or enqueue) a POST /download request; returns (status_code, response body)."""
     url = req.url.strip()
     platform = (req.platform or "").lower().strip() if req.platform else None
     media_type = (req.media_type or "").lower().strip() if req.media_type else None
@@ -578,79 +955,35 @@ async def download_endpoint(req: DownloadRequest, x_api_key: str = Header(None))
 
     if not platform:
         try:
-            platform = detect_platform(url)
+            with tracing.span("detect_platform"):
+                platform = detect_platform(url)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
+    if platform not in SUPPORTED_PLATFORMS:
+        raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
+    note_request(platform, url, media_type)
+
+    if JOB_QUEUE:
+        payload = {"url": url, "platform": platform, "media_type": media_type, "filename": desired_name}
+        with tracing.span("enqueue") as enqueue_span:
+            if trace is not None:
+                # the worker continues this trace under the enqueue span
+                payload["trace"] = {"trace_id": trace.trace_id, "parent_span_id": enqueue_span["spanId"],
+                                    "profile": trace.profile}
+            job_id = await asyncio.to_thread(JOB_QUEUE.enqueue, payload)
+        with tracing.span("wait_for_job", job_id=job_id):
+            job = await wait_for_job(job_id)
+        if job["status"] == DONE:
+            return 200, job["result"]
+        if job["status"] == FAILED:
+            raise HTTPException(status_code=500, detail=job["error"] or "Download failed")
+        # still queued or running: hand the caller a job to poll
+        return 202, job_status_content(job)
 
     task_dir = make_task_dir()
     try:
-        if platform == "instagram":
-            filepaths = download_instagram(url, task_dir)
-
-        elif platform == "youtube":
-            mt = media_type if media_type in ("audio", "video") else "video"
-            filepath = download_yt(url, task_dir, media_type=mt)
-
-        elif platform in ("x", "twitter"):
-            filepath = download_x(url, task_dir)
-
-        elif platform == "spotify":
-            filepath = download_spotify(url, task_dir, enforce_mp3=True)
-
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
-
-        # If instagram returned multiple file paths, register each and return ordered list
-        if platform == "instagram":
-            if not isinstance(filepaths, (list, tuple)):
-                filepaths = [filepaths]
-            # apply desired_name only to the first file (if provided)
-            out_entries = []
-            for idx, fp in enumerate(filepaths):
-                orig_ext = os.path.splitext(fp)[1] or ""
-                if idx == 0 and desired_name:
-                    safe_name = sanitize_filename(desired_name)
-                    newpath = os.path.join(os.path.dirname(fp), safe_name + orig_ext)
-                    if os.path.exists(newpath):
-                        newpath = os.path.join(os.path.dirname(fp), f"{safe_name}_{str(uuid.uuid4())[:8]}{orig_ext}")
-                    os.rename(fp, newpath)
-                    fp = newpath
-
-                file_id = register_file(fp)
-                out_entries.append({
-                    "file_id": file_id,
-                    "download_url": f"/files/{file_id}",
-                    "filename": os.path.basename(fp)
-                })
-
-            return JSONResponse(status_code=200, content={
-                "status": "ok",
-                "files": out_entries
-            })
-
-        # non-instagram (single file) flow continues below
-        filepath = filepaths if not isinstance(filepaths, (list, tuple)) else filepaths[0]
-
-        # If desired filename provided, rename file to that name (preserve extension)
-        if desired_name:
-            safe_name = sanitize_filename(desired_name)
-            ext = os.path.splitext(filepath)[1] or ""
-            newpath = os.path.join(os.path.dirname(filepath), safe_name + ext)
-            # if target exists, append uuid short
-            if os.path.exists(newpath):
-                newpath = os.path.join(os.path.dirname(filepath), f"{safe_name}_{str(uuid.uuid4())[:8]}{ext}")
-            os.rename(filepath, newpath)
-            filepath = newpath
-
-        # Register and return download info for single file
-        file_id = register_file(filepath)
-        download_url = f"/files/{file_id}"
-        return JSONResponse(status_code=200, content={
-            "status": "ok",
-            "file_id": file_id,
-            "download_url": download_url,
-            "filename": os.path.basename(filepath)
-        })
+        filepaths = await asyncio.to_thread(run_user_download, platform, url, task_dir, media_type)
+        return 200, build_download_response(platform, filepaths, desired_name)
     except HTTPException:
         raise
     except Exception as e:
@@ -661,10 +994,23 @@ async def download_endpoint(req: DownloadRequest, x_api_key: str = Header(None))
             pass
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, x_api_key: str = Header(None)):
+    validate_api_key(x_api_key)
+    job = await asyncio.to_thread(JOB_QUEUE.get, job_id) if JOB_QUEUE else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == DONE:
+        return job["result"]
+    content = job_status_content(job)
+    if job["status"] == FAILED:
+        content["detail"] = job["error"]
+    return content
+
 @app.get("/files/{file_id}")
 async def serve_file(file_id: str, x_api_key: str = Header(None), background: BackgroundTasks = None):
     validate_api_key(x_api_key)
-    path = file_path_by_id(file_id)
+    path = await asyncio.to_thread(file_path_by_id, file_id)
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File not found")
     # Determine appropriate media_type header for browser
@@ -690,33 +1036,36 @@ async def download_get(url: str, media_type: Optional[str] = None, x_api_key: st
     """
     validate_api_key(x_api_key)
 
+    # basic platform detection
     try:
-        # basic platform detection
-        platform = None
-        try:
-            platform = detect_platform(url)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Unsupported or invalid URL")
+        platform = detect_platform(url)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Unsupported or invalid URL")
+    note_request(platform, url, media_type)
+
+    if JOB_QUEUE:
+        job_id = await asyncio.to_thread(JOB_QUEUE.enqueue, {
+            "url": url, "platform": platform, "media_type": media_type, "filename": None,
+        })
+        job = await wait_for_job(job_id)
+        if job["status"] == FAILED:
+            raise HTTPException(status_code=500, detail=job["error"] or "Download failed")
+        if job["status"] != DONE:
+            return JSONResponse(status_code=202, content=job_status_content(job))
+        result = job["result"]
+        if "files" in result:
+            return JSONResponse(status_code=200, content=result)
+        filepath = await asyncio.to_thread(file_path_by_id, result["file_id"])
+        if background is not None:
+            schedule_remove(background, filepath, file_id=result["file_id"])
+        return FileResponse(filepath, filename=os.path.basename(filepath))
 
-        task_dir = make_task_dir()
+    task_dir = make_task_dir()
+    try:
+        filepaths = await asyncio.to_thread(run_user_download, platform, url, task_dir, media_type)
         if platform == "instagram":
-            filepaths = download_instagram(url, task_dir)
-            if not isinstance(filepaths, (list, tuple)):
-                filepaths = [filepaths]
-            out_entries = []
-            for fp in filepaths:
-                fid = register_file(fp)
-                out_entries.append({"file_id": fid, "download_url": f"/files/{fid}", "filename": os.path.basename(fp)})
-            return JSONResponse(status_code=200, content={"status": "ok", "files": out_entries})
-        elif platform == "youtube":
-            mt = media_type if media_type in ("audio", "video") else "video"
-            filepath = download_yt(url, task_dir, media_type=mt)
-        elif platform in ("x", "twitter"):
-            filepath = download_x(url, task_dir)
-        elif platform == "spotify":
-            filepath = download_spotify(url, task_dir, enforce_mp3=True)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
+            return JSONResponse(status_code=200, content=build_download_response(platform, filepaths, None))
+        filepath = filepaths if not isinstance(filepaths, (list, tuple)) else filepaths[0]
 
         # Schedule deletion of the file and its parent dir after sending
         if background is not None:
@@ -732,6 +1081,53 @@ async def download_get(url: str, media_type: Optional[str] = None, x_api_key: st
             pass
         raise HTTPException(status_code=500, detail=str(e))
 
+def require_prefetch_admin(x_api_key: Optional[str]):
+    if not is_admin_key(x_api_key):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    if not PREFETCH:
+        raise HTTPException(status_code=409, detail="Prefetch is disabled (needs PREFETCH=1 and DEDUP_STORE=1)")
+
+@app.get("/admin/prefetch")
+async def prefetch_status(x_api_key: str = Header(None)):
+    if not is_admin_key(x_api_key):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    if not PREFETCH:
+        return {"enabled": False, "watchlist": [], "hot": []}
+    return {
+        "enabled": PREFETCH,
+        "watchlist": [dict(r, key=k) for k, r in (await asyncio.to_thread(PREFETCH_STATE.watchlist)).items()],
+        "hot": [{"key": k, "requests": n, "url": r["url"]}
+                for k, n, r in await asyncio.to_thread(PREFETCH_STATE.top, PREFETCH_TOP_N)],
+    }
+
+@app.post("/admin/prefetch")
+async def prefetch_watch(req: WatchlistRequest, x_api_key: str = Header(None)):
+    """Add URLs to the prefetch watchlist; they are kept warm regardless of traffic."""
+    require_prefetch_admin(x_api_key)
+    media_type = (req.media_type or "").lower().strip() or None
+    entries = {}
+    for url in req.urls:
+        url = url.strip()
+        try:
+            platform = detect_platform(url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{url}: {e}")
+        key = cache_key(platform, url, media_type)
+        entries[key] = {"url": url, "platform": platform, "media_type": media_type}
+    await asyncio.to_thread(PREFETCH_STATE.watch, entries)
+    return {"status": "ok", "added": list(entries)}
+
+@app.delete("/admin/prefetch")
+async def prefetch_unwatch(url: str, media_type: Optional[str] = None, x_api_key: str = Header(None)):
+    require_prefetch_admin(x_api_key)
+    try:
+        key = cache_key(detect_platform(url), url, media_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await asyncio.to_thread(PREFETCH_STATE.unwatch, key):
+        raise HTTPException(status_code=404, detail="URL not in watchlist")
+    return {"status": "ok", "removed": key}
+
 
 @app.get('/diag/instaloader')
 async def diag_instaloader():
@@ -742,6 +1138,7 @@ async def diag_instaloader():
         if session_file and os.path.exists(session_file):
             result['session_exists'] = True
             try:
+                import instaloader
                 L = instaloader.Instaloader()
                 try:
                     with open(session_file, 'rb') as sf:
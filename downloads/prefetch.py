@@ -0,0 +1,261 @@
+# prefetch.py
+# Request popularity over a sliding window, used to warm the blob store ahead of demand.
+#
+# Every API process counts its own requests in memory; SharedPrefetchState publishes
+# those counts, its in-flight user downloads, the watchlist and pending markers as files
+# under DOWNLOAD_ROOT/.blobs so
+# all processes (and nodes sharing DOWNLOAD_ROOT) see the same state, and elects one
+# process at a time to run the prefetch rounds.
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("media-downloader")
+
+
+class PopularityTracker:
+    """Counts requests per cache key in fixed-size time buckets covering window_seconds."""
+
+    def __init__(self, window_seconds: float, bucket_seconds: float = 60):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self._buckets = deque()  # (bucket_start, Counter)
+        self._requests = {}  # key -> latest request dict, to know how to fetch it again
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._buckets and self._buckets[0][0] + self.bucket_seconds <= cutoff:
+            self._buckets.popleft()
+        if not self._buckets:
+            self._requests.clear()
+        elif len(self._requests) > 2 * sum(len(c) for _, c in self._buckets):
+            # keys that fell out of the window
+            live = set()
+            for _, c in self._buckets:
+                live.update(c)
+            self._requests = {k: v for k, v in self._requests.items() if k in live}
+
+    def record(self, key: str, request: dict, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        start = now - (now % self.bucket_seconds)
+        with self._lock:
+            if not self._buckets or self._buckets[-1][0] != start:
+                self._buckets.append((start, Counter()))
+            self._buckets[-1][1][key] += 1
+            self._requests[key] = request
+            self._prune(now)
+
+    def top(self, n: int, min_count: int = 1, now: Optional[float] = None) -> list:
+        """Hottest keys as [(key, count, request)], most requested first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._prune(now)
+            total = Counter()
+            for _, c in self._buckets:
+                total.update(c)
+            return [(k, cnt, self._requests[k]) for k, cnt in total.most_common(n) if cnt >= min_count]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"buckets": [[start, dict(c)] for start, c in self._buckets], "requests": dict(self._requests)}
+
+    def merge(self, snapshot: dict):
+        """Add the counts of another tracker's snapshot() to this one."""
+        with self._lock:
+            by_start = dict(self._buckets)
+            for start, counts in snapshot["buckets"]:
+                by_start.setdefault(start, Counter()).update(counts)
+            self._buckets = deque(sorted(by_start.items()))
+            for k, request in snapshot["requests"].items():
+                self._requests.setdefault(k, request)
+
+
+def _lock_fd(fd: int, blocking: bool) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        if blocking:
+            raise
+        return False
+
+
+def _unlock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _read_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _write_json(path: str, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class SharedPrefetchState:
+    """Watchlist, request counts, in-flight downloads and pending markers shared through files under root."""
+
+    def __init__(self, root: str, window_seconds: float):
+        self.root = root
+        self.window_seconds = window_seconds
+        self.popularity = PopularityTracker(window_seconds)  # this process's requests
+        self.counts_dir = os.path.join(root, "popularity")
+        self.active_dir = os.path.join(root, "active")
+        os.makedirs(self.counts_dir, exist_ok=True)
+        os.makedirs(self.active_dir, exist_ok=True)
+        process_id = uuid.uuid4().hex
+        self._counts_path = os.path.join(self.counts_dir, process_id + ".json")
+        self._active_path = os.path.join(self.active_dir, process_id + ".json")
+        self._active = 0  # user downloads running in this process
+        self._active_lock = threading.Lock()
+        self._watchlist_path = os.path.join(root, "watchlist.json")
+        self._pending_path = os.path.join(root, "pending.json")
+        self._leader_fd = None
+
+    @contextmanager
+    def _locked(self):
+        """Serialize read-modify-write of the shared files across processes."""
+        fd = os.open(os.path.join(self.root, "state.lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            _lock_fd(fd, blocking=True)
+            try:
+                yield
+            finally:
+                _unlock_fd(fd)
+        finally:
+            os.close(fd)
+
+    def try_lead(self) -> bool:
+        """True if this process runs the prefetch rounds; the lock is held until it exits."""
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(os.path.join(self.root, "leader.lock"), os.O_RDWR | os.O_CREAT)
+        if not _lock_fd(fd, blocking=False):
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        logger.info("This process now runs the prefetch rounds (pid %s)", os.getpid())
+        return True
+
+    def record(self, key: str, request: dict):
+        self.popularity.record(key, request)
+
+    def flush(self):
+        """Publish this process's counts for top() in the other processes, and show it is alive."""
+        _write_json(self._counts_path, self.popularity.snapshot())
+        with self._active_lock:
+            _write_json(self._active_path, self._active)
+
+    def _add_active(self, n: int):
+        with self._active_lock:
+            self._active += n
+            try:
+                _write_json(self._active_path, self._active)
+            except OSError:
+                # never fail the user's download over it; the next flush() retries
+                logger.warning("Could not publish in-flight downloads to %s", self._active_path)
+
+    def download_started(self):
+        self._add_active(1)
+
+    def download_finished(self):
+        self._add_active(-1)
+
+    def downloads_in_flight(self, stale_after: float) -> int:
+        """User downloads running in any process; a process that hasn't flush()ed for
+        stale_after seconds is assumed gone."""
+        with self._active_lock:
+            total = self._active
+        now = time.time()
+        for name in os.listdir(self.active_dir):
+            path = os.path.join(self.active_dir, name)
+            if path == self._active_path or not name.endswith(".json"):
+                continue
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if age > self.window_seconds:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif age <= stale_after:
+                total += _read_json(path) or 0
+        return total
+
+    def top(self, n: int, min_count: int = 1) -> list:
+        """Hottest keys over all processes' published counts, like PopularityTracker.top()."""
+        merged = PopularityTracker(self.window_seconds)
+        merged.merge(self.popularity.snapshot())
+        now = time.time()
+        for name in os.listdir(self.counts_dir):
+            path = os.path.join(self.counts_dir, name)
+            if path == self._counts_path or not name.endswith(".json"):
+                continue
+            try:
+                if now - os.path.getmtime(path) > self.window_seconds:
+                    os.remove(path)  # process gone for a whole window
+                    continue
+            except OSError:
+                continue
+            snapshot = _read_json(path)
+            if snapshot:
+                merged.merge(snapshot)
+        return merged.top(n, min_count, now)
+
+    def watchlist(self) -> dict:
+        """cache key -> request dict"""
+        return _read_json(self._watchlist_path) or {}
+
+    def watch(self, entries: dict):
+        with self._locked():
+            watchlist = self.watchlist()
+            watchlist.update(entries)
+            _write_json(self._watchlist_path, watchlist)
+
+    def unwatch(self, key: str) -> bool:
+        with self._locked():
+            watchlist = self.watchlist()
+            if watchlist.pop(key, None) is None:
+                return False
+            _write_json(self._watchlist_path, watchlist)
+            return True
+
+    def claim_pending(self, key: str, hold_seconds: float) -> bool:
+        """Mark key as handed to the job queue; False if that happened less than hold_seconds ago."""
+        with self._locked():
+            now = time.time()
+            pending = {k: t for k, t in (_read_json(self._pending_path) or {}).items() if now - t < hold_seconds}
+            if key in pending:
+                return False
+            pending[key] = now
+            _write_json(self._pending_path, pending)
+            return True
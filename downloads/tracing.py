@@ -0,0 +1,272 @@
+# tracing.py
+# Opt-in per-request traces exported as OpenTelemetry (OTLP/JSON) documents.
+import os
+import json
+import time
+import sys
+import random
+import cProfile
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+from . import httpclient
+
+logger = logging.getLogger("media-downloader")
+
+# Fraction of /download requests traced without asking (0.0 disables sampling)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+# Also cProfile sampled requests (debug requests choose via their own flag)
+TRACE_PROFILE_SAMPLED = os.environ.get("TRACE_PROFILE_SAMPLED", "0") == "1"
+# Traces are appended as one OTLP/JSON document per line; .pstats dumps go next to it
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(os.getcwd(), "traces", "traces.jsonl"))
+# Optional OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT")
+SERVICE_NAME = "media-downloader"
+
+_current = contextvars.ContextVar("current_trace", default=None)
+# Up to 3.11 cProfile hooks only the thread that enables it; from 3.12 it is built on
+# sys.monitoring, which sees every thread, and only one profiler may be active at a time.
+# Either way one profiled request at a time, so two profiles never mix or fail.
+_profile_lock = threading.Lock()
+PROFILE_SCOPE = "process" if sys.version_info >= (3, 12) else "thread"
+
+# OTLP enums
+_KIND_INTERNAL = 1
+_KIND_SERVER = 2
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+def _attr(key: str, value) -> dict:
+    if isinstance(value, bool):
+        v = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+
+class Trace:
+    """Spans for one request. Not thread-safe; a request's work runs on one thread."""
+
+    def __init__(self, name: str, profile: bool = False, trace_id: Optional[str] = None,
+                 parent_span_id: str = "", **attributes):
+        # trace_id/parent_span_id let a queue worker continue the API node's trace
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.parent_span_id = parent_span_id
+        self.spans = []
+        self._stack = []
+        self.profile_path = None
+        self.profile = profile
+        self._profiler = None
+        self.root = self._open(name, _KIND_SERVER, attributes)
+
+
+    def _open(self, name: str, kind: int, attributes: dict) -> dict:
+        s = {
+            "traceId": self.trace_id,
+            "spanId": os.urandom(8).hex(),
+            "parentSpanId": self._stack[-1]["spanId"] if self._stack else self.parent_span_id,
+            "name": name,
+            "kind": kind,
+            "startTimeUnixNano": time.time_ns(),
+            "endTimeUnixNano": None,
+            "attributes": dict(attributes),
+            "status": {"code": _STATUS_OK},
+        }
+        self.spans.append(s)
+        self._stack.append(s)
+        return s
+
+    def _close(self, s: dict, error: Optional[BaseException] = None):
+        s["endTimeUnixNano"] = time.time_ns()
+        if error is not None:
+            s["status"] = {"code": _STATUS_ERROR, "message": str(error)}
+        if self._stack and self._stack[-1] is s:
+            self._stack.pop()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        s = self._open(name, _KIND_INTERNAL, attributes)
+        try:
+            yield s
+        except BaseException as e:
+            self._close(s, e)
+            raise
+        self._close(s)
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, **attributes):
+        """Record a span measured elsewhere (e.g. from yt-dlp hooks) under the current span."""
+        s = self._open(name, _KIND_INTERNAL, attributes)
+        s["startTimeUnixNano"] = start_ns
+        self._close(s)
+        s["endTimeUnixNano"] = end_ns
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self._profiler is not None:
+            self.profile_path = os.path.join(os.path.dirname(TRACE_FILE), f"{self.trace_id}.pstats")
+            try:
+                os.makedirs(os.path.dirname(self.profile_path), exist_ok=True)
+                self._profiler.dump_stats(self.profile_path)
+                self.root["attributes"]["profile.path"] = self.profile_path
+            except Exception:
+                logger.exception("Failed to write profile %s", self.profile_path)
+        # close anything left open by an exception path, innermost first
+        while self._stack:
+            self._close(self._stack[-1], error)
+
+    def to_otlp(self) -> dict:
+        spans = []
+        for s in self.spans:
+            out = dict(s)
+            out["startTimeUnixNano"] = str(s["startTimeUnixNano"])
+            out["endTimeUnixNano"] = str(s["endTimeUnixNano"] or s["startTimeUnixNano"])
+            out["attributes"] = [_attr(k, v) for k, v in s["attributes"].items()]
+            if not out["parentSpanId"]:
+                del out["parentSpanId"]
+            spans.append(out)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_attr("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+        }]}
+
+
+def should_sample() -> bool:
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def traced(name: str, enabled: bool, profile: bool = False, trace_id: Optional[str] = None,
+           parent_span_id: str = "", **attributes):
+    """Make a Trace current for the block (yields None when disabled) and export it afterwards."""
+    if not enabled:
+        yield None
+        return
+    trace = Trace(name, profile=profile, trace_id=trace_id, parent_span_id=parent_span_id, **attributes)
+    token = _current.set(trace)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        trace.finish(error)
+        export(trace)
+
+
+@contextmanager
+def profiling():
+    """cProfile the enclosed synchronous work if the current trace asked for a profile.
+
+    Wrap only code that runs without yielding to the event loop. Up to Python 3.11 the
+    stats then hold this request's work only; on 3.12+ they also include whatever other
+    threads (concurrent downloads, prefetch) ran meanwhile, which the trace records as
+    profile.scope = "process". One profile per process at a time; a request that can't
+    get it is traced without a profile.
+    """
+    trace = _current.get()
+    if trace is None or not trace.profile or trace._profiler is not None:
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        trace.root["attributes"]["profile.skipped"] = "another profile is running"
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # another profiling tool (debugger, coverage) owns the hook
+        _profile_lock.release()
+        trace.root["attributes"]["profile.skipped"] = str(e)
+        yield
+        return
+    trace.root["attributes"]["profile.scope"] = PROFILE_SCOPE
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        trace._profiler = profiler
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current trace; no-op when the request isn't traced."""
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+    with trace.span(name, **attributes) as s:
+        yield s
+
+
+@contextmanager
+def ytdl_phases(ydl_opts: dict):
+    """Yield a copy of ydl_opts with hooks that split extract_info(download=True)
+    into extract / download / postprocess spans."""
+    trace = _current.get()
+    if trace is None:
+        yield ydl_opts
+        return
+    opts = dict(ydl_opts)
+    marks = {"start": time.time_ns(), "dl_start": None, "dl_end": None, "pp_start": None, "pp_end": None}
+
+    def progress(d):
+        now = time.time_ns()
+        if marks["dl_start"] is None:
+            marks["dl_start"] = now
+        if d.get("status") in ("finished", "error"):
+            marks["dl_end"] = now
+
+    def postprocess(d):
+        now = time.time_ns()
+        if d.get("status") == "started" and marks["pp_start"] is None:
+            marks["pp_start"] = now
+        elif d.get("status") == "finished":
+            marks["pp_end"] = now
+
+    opts["progress_hooks"] = list(opts.get("progress_hooks", [])) + [progress]
+    opts["postprocessor_hooks"] = list(opts.get("postprocessor_hooks", [])) + [postprocess]
+    try:
+        yield opts
+    finally:
+        end = time.time_ns()
+        trace.add_span("extract", marks["start"], marks["dl_start"] or end)
+        if marks["dl_start"] is not None:
+            trace.add_span("download", marks["dl_start"], marks["dl_end"] or marks["pp_start"] or end)
+        if marks["pp_start"] is not None:
+            trace.add_span("postprocess", marks["pp_start"], marks["pp_end"] or end)
+
+
+def _write(trace: Trace):
+    doc = json.dumps(trace.to_otlp())
+    if TRACE_FILE:
+        try:
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(doc + "\n")
+        except Exception:
+            logger.exception("Failed to write trace %s", trace.trace_id)
+    if TRACE_OTLP_ENDPOINT:
+        try:
+            httpclient.post_json(TRACE_OTLP_ENDPOINT, doc, timeout=5)
+        except Exception:
+            logger.exception("Failed to send trace %s to %s", trace.trace_id, TRACE_OTLP_ENDPOINT)
+
+
+def export(trace: Trace):
+    # off the request path; losing a trace on shutdown is acceptable
+    threading.Thread(target=_write, args=(trace,), daemon=True).start()
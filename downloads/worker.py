@@ -0,0 +1,137 @@
+# worker.py
+# Pulls download jobs from the shared queue (JOB_QUEUE_URL) and runs them.
+#   python -m downloads.worker --processes 4
+import os
+import uuid
+import shutil
+import socket
+import argparse
+import threading
+import multiprocessing
+import time
+import logging
+
+from . import main
+from .jobqueue import queue_from_url, DEFAULT_LEASE_SECONDS
+from . import tracing
+
+logger = logging.getLogger("media-downloader")
+
+POLL_INTERVAL_SECONDS = 1.0
+# Any node may requeue lapsed leases; doing it on every idle poll would be wasteful
+REQUEUE_INTERVAL_SECONDS = 15.0
+
+
+def process_job(queue, payload: dict) -> dict:
+    """Run one download and publish its files to the shared registry. Returns the API response body."""
+    trace_ctx = payload.get("trace") or {}
+    with tracing.traced("worker.job", enabled=bool(trace_ctx), profile=trace_ctx.get("profile", False),
+                        trace_id=trace_ctx.get("trace_id"), parent_span_id=trace_ctx.get("parent_span_id", ""),
+                        url=payload["url"]):
+        return _process_job(queue, payload)
+
+
+def _process_job(queue, payload: dict) -> dict:
+    if payload.get("prefetch"):
+        # cache warming: result lands in the blob store, nothing to hand back
+        main.prefetch_one(payload)
+        return {"status": "ok", "prefetched": payload["url"]}
+    task_dir = main.make_task_dir()
+    try:
+        filepaths = main.run_download(payload["platform"], payload["url"], task_dir, payload.get("media_type"))
+
+        def publish(path: str) -> str:
+            file_id = str(uuid.uuid4())
+            queue.publish_file(file_id, path)
+            return file_id
+
+        return main.build_download_response(payload["platform"], filepaths, payload.get("filename"), register=publish)
+    except Exception:
+        shutil.rmtree(task_dir, ignore_errors=True)
+        raise
+
+
+def _heartbeat_loop(queue, job_id: str, worker_id: str, lease_seconds: int, stop: threading.Event):
+    # renew at a third of the lease so one missed beat doesn't lose the job
+    while not stop.wait(lease_seconds / 3):
+        try:
+            if not queue.heartbeat(job_id, worker_id, lease_seconds):
+                logger.warning("Lost lease on job %s; another worker may pick it up", job_id)
+                return
+        except Exception:
+            logger.exception("Heartbeat failed for job %s", job_id)
+
+
+def run_worker(queue_url: str, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+    """Claim and process jobs forever."""
+    started = time.monotonic()
+    queue = queue_from_url(queue_url)
+    if main.WARMUP:
+        # pre-initialize extractors/sessions before taking jobs off the queue
+        try:
+            main.warmup()
+        except Exception:
+            logger.exception("Worker warm-up failed; continuing")
+    logger.info("Worker %s ready in %.3fs (queue %s)", worker_id, time.monotonic() - started, queue_url)
+    last_requeue = 0.0
+    while True:
+        now = time.monotonic()
+        if now - last_requeue >= REQUEUE_INTERVAL_SECONDS:
+            last_requeue = now
+            try:
+                n = queue.requeue_expired()
+                if n:
+                    logger.info("Requeued %s job(s) with expired leases", n)
+            except Exception:
+                logger.exception("Requeue of expired jobs failed")
+
+        try:
+            job = queue.claim(worker_id, lease_seconds)
+        except Exception:
+            logger.exception("Claiming job failed")
+            job = None
+        if not job:
+            time.sleep(POLL_INTERVAL_SECONDS)
+            continue
+
+        job_id = job["id"]
+        logger.info("Worker %s running job %s (attempt %s): %s", worker_id, job_id, job["attempts"], job["payload"].get("url"))
+        stop = threading.Event()
+        hb = threading.Thread(target=_heartbeat_loop, args=(queue, job_id, worker_id, lease_seconds, stop), daemon=True)
+        hb.start()
+        try:
+            result = process_job(queue, job["payload"])
+            queue.complete(job_id, worker_id, result)
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            queue.fail(job_id, worker_id, str(e))
+        finally:
+            stop.set()
+            hb.join()
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Universal Media Downloader worker")
+    parser.add_argument("--queue", default=os.environ.get("JOB_QUEUE_URL"), help="queue URL (default: $JOB_QUEUE_URL)")
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("WORKER_PROCESSES", "1")),
+                        help="worker processes on this machine")
+    parser.add_argument("--lease", type=int, default=DEFAULT_LEASE_SECONDS, help="job lease in seconds")
+    args = parser.parse_args()
+    if not args.queue:
+        parser.error("set --queue or JOB_QUEUE_URL")
+
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    if args.processes <= 1:
+        run_worker(args.queue, base_id, args.lease)
+        return
+    procs = []
+    for i in range(args.processes):
+        p = multiprocessing.Process(target=run_worker, args=(args.queue, f"{base_id}:{i}", args.lease), daemon=True)
+        p.start()
+        procs.append(p)
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# downloads/ is imported as a package from the repository root (uvicorn downloads.main:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
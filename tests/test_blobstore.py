@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+
+import pytest
+
+from downloads import blobstore
+from downloads.blobstore import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobstore, "SWEEP_GRACE_SECONDS", -1)
+    return BlobStore(str(tmp_path / ".blobs"), ttl_seconds=3600)
+
+
+def write(path, data: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_identical_files_share_one_blob(store, tmp_path):
+    a = write(tmp_path / "t1" / "a.mp4", b"x" * 1000)
+    b = write(tmp_path / "t2" / "b.mp4", b"x" * 1000)
+    store.ingest("youtube:abc|video", a)
+    store.ingest("spotify:track/1", b)
+    assert os.path.samefile(a, b)
+    assert os.stat(a).st_nlink == 3  # blob + two task links
+    assert store.usage_bytes() == 1000
+
+
+def test_lookup_links_cached_result(store, tmp_path):
+    a = write(tmp_path / "t1" / "a.mp4", b"video")
+    store.ingest("youtube:abc|video", a)
+    target = tmp_path / "t2"
+    target.mkdir()
+    hit = store.lookup("youtube:abc|video", str(target))
+    assert hit == str(target / "a.mp4") and read(hit) == b"video"
+    assert store.lookup("youtube:other|video", str(target)) is None
+
+
+def test_lookup_keeps_list_shape(store, tmp_path):
+    files = [write(tmp_path / "t1" / "v.mp4", b"v"), write(tmp_path / "t1" / "i.jpg", b"i")]
+    store.ingest("instagram:X", files)
+    target = tmp_path / "t2"
+    target.mkdir()
+    hit = store.lookup("instagram:X", str(target))
+    assert [os.path.basename(p) for p in hit] == ["v.mp4", "i.jpg"]
+
+
+def test_lookup_misses_expired_entry(store, tmp_path):
+    store.ingest("k", write(tmp_path / "t1" / "a.mp4", b"a"))
+    store.ttl_seconds = -1
+    assert store.lookup("k", str(tmp_path)) is None
+
+
+def test_sweep_keeps_linked_and_indexed_blobs(store, tmp_path):
+    a = write(tmp_path / "t1" / "a.mp4", b"a")
+    store.ingest("k", a)
+    assert store.sweep() == 0  # still linked from the task dir
+    os.remove(a)
+    assert store.sweep() == 0  # unlinked but the index entry is live
+    store.ttl_seconds = -1
+    assert store.sweep() == 1
+    assert store.usage_bytes() == 0
+    assert os.listdir(store.index_dir) == []
+
+
+def test_sweep_evicts_oldest_unlinked_over_budget(store, tmp_path):
+    old = write(tmp_path / "t1" / "old.mp4", b"o" * 100)
+    store.ingest("old", old)
+    os.remove(old)
+    time.sleep(0.05)
+    new = write(tmp_path / "t2" / "new.mp4", b"n" * 100)
+    store.ingest("new", new)
+    os.remove(new)
+    held = write(tmp_path / "t3" / "held.mp4", b"h" * 100)
+    store.ingest("held", held)
+
+    store.max_bytes = 200
+    assert store.sweep() == 1
+    assert store.lookup("old", str(tmp_path / "t3")) is None
+    os.remove(store.lookup("new", str(tmp_path / "t3")))
+
+    # blobs still linked from a task can't be freed, even over budget
+    store.max_bytes = 0
+    store.sweep()
+    assert read(held) == b"h" * 100
+    assert store.usage_bytes() == 100
+
+
+def test_dedup_hit_survives_blob_swept_underneath(store, tmp_path, monkeypatch):
+    first = write(tmp_path / "t1" / "a.mp4", b"same")
+    store.ingest(None, first)
+    os.remove(first)
+    second = write(tmp_path / "t2" / "b.mp4", b"same")
+
+    real_link = BlobStore._link
+    swept = []
+
+    def sweep_then_link(src, dest):
+        # the blob disappears between add()'s exists() check and the link
+        if not swept:
+            swept.append(src)
+            os.remove(src)
+        real_link(src, dest)
+
+    monkeypatch.setattr(BlobStore, "_link", staticmethod(sweep_then_link))
+    store.ingest(None, second)
+    assert read(second) == b"same"
+    assert os.path.samefile(second, store.blob_path(blobstore.file_digest(second)))
+
+
+def test_concurrent_ingest_of_one_key(store, tmp_path):
+    errors = []
+
+    def download(n):
+        for i in range(30):
+            try:
+                store.ingest("hot", write(tmp_path / f"t{n}-{i}" / "a.mp4", b"same"))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=download, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert read(store.lookup("hot", str(tmp_path))) == b"same"
+    assert os.listdir(store.index_dir) == [os.path.basename(store._index_path("hot"))]
+
+
+def test_index_write_failure_keeps_download(store, tmp_path, monkeypatch):
+    def no_space(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(blobstore.tempfile, "mkstemp", no_space)
+    a = write(tmp_path / "t1" / "a.mp4", b"a")
+    assert store.ingest("k", a) == a
+    assert read(a) == b"a"
+    assert store.lookup("k", str(tmp_path)) is None
+
+
+def test_lookup_counts_as_use_for_eviction(store, tmp_path):
+    for name, age in (("a", 300), ("b", 200)):
+        p = write(tmp_path / name / "f.mp4", name.encode() * 100)
+        store.ingest(name, p)
+        os.remove(p)
+        old = time.time() - age
+        os.utime(store.blob_path(store._read_entry(store._index_path(name))["files"][0]["digest"]), (old, old))
+    # "a" is the older blob, but was just used again
+    os.remove(store.lookup("a", str(tmp_path)))
+
+    store.max_bytes = 100
+    assert store.sweep() == 1
+    assert store.lookup("b", str(tmp_path / "b")) is None
+    assert store.lookup("a", str(tmp_path / "b")) is not None
+
+
+def test_new_blob_gets_grace_even_if_file_is_backdated(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(blobstore, "SWEEP_GRACE_SECONDS", 120)
+    p = write(tmp_path / "t1" / "a.mp4", b"a")
+    os.utime(p, (0, 0))  # downloaders may set the upload date as mtime
+    store.ingest(None, p)
+    os.remove(p)
+    assert store.sweep() == 0
+    assert store.usage_bytes() == 1
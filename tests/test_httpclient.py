@@ -0,0 +1,35 @@
+import re
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from downloads import httpclient
+
+OG_VIDEO = (
+    re.compile(r'<meta\s+property="og:video"\s+content="([^"]+)"'),
+    re.compile(r'<meta\s+property="og:video:secure_url"\s+content="([^"]+)"'),
+)
+LONG_URL = "https://cdn.example/v.mp4?sig=" + "a" * 1500
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    def _serve(html: str, chunk_size: int):
+        body = html.encode("utf-8")
+        chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        client = httpx.Client(transport=httpx.MockTransport(lambda req: httpx.Response(200, content=iter(chunks))))
+        monkeypatch.setattr(httpclient, "_client", client)
+    return _serve
+
+
+@pytest.mark.parametrize("chunk_size", [3, 512, 4096, 1 << 20])
+def test_long_tag_across_chunks(serve, chunk_size):
+    serve("<html><head>" + "x" * 3000 + f'<meta property="og:video" content="{LONG_URL}"></head>', chunk_size)
+    assert httpclient.find_meta("http://example/", OG_VIDEO) == LONG_URL
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1 << 20])
+def test_fallback_pattern_used_at_end_of_head(serve, chunk_size):
+    serve('<html><head><meta property="og:video:secure_url" content="S"></head><body>' + "y" * 5000, chunk_size)
+    assert httpclient.find_meta("http://example/", OG_VIDEO) == "S"
@@ -0,0 +1,176 @@
+import time
+
+import pytest
+
+from downloads import jobqueue
+from downloads.jobqueue import JobQueue, SQLiteJobQueue, RedisJobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+class StandInRedis:
+    """In-memory stand-in for the redis-py command subset RedisJobQueue uses."""
+
+    def __init__(self):
+        self.hashes, self.lists, self.zsets, self.ttls = {}, {}, {}, {}
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        h = self.hashes.setdefault(key, {})
+        if field is not None:
+            h[field] = str(value)
+        for k, v in (mapping or {}).items():
+            h[k] = str(v)
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hincrby(self, key, field, n):
+        h = self.hashes.setdefault(key, {})
+        h[field] = str(int(h.get(field, 0)) + n)
+
+    def hdel(self, key, field):
+        return int(self.hashes.get(key, {}).pop(field, None) is not None)
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    def rpoplpush(self, src, dst):
+        items = self.lists.get(src)
+        if not items:
+            return None
+        v = items.pop()
+        self.lpush(dst, v)
+        return v
+
+    def lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return list(items[start:] if end == -1 else items[start:end + 1])
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        n = items.count(value)
+        self.lists[key] = [v for v in items if v != value]
+        return n
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        return int(self.zsets.get(key, {}).pop(member, None) is not None)
+
+    def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    def zrangebyscore(self, key, lo, hi):
+        z = self.zsets.get(key, {})
+        return [m for m, s in sorted(z.items(), key=lambda kv: kv[1]) if lo <= s <= hi]
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    return RedisJobQueue(StandInRedis())
+
+
+def test_claim_complete(queue):
+    job_id = queue.enqueue({"url": "u"})
+    job = queue.claim("w1")
+    assert job["id"] == job_id and job["status"] == RUNNING and job["attempts"] == 1
+    assert queue.claim("w2") is None
+    queue.complete(job_id, "w1", {"status": "ok"})
+    job = queue.get(job_id)
+    assert job["status"] == DONE and job["result"] == {"status": "ok"}
+
+
+def test_low_priority_claimed_last(queue):
+    low = queue.enqueue({"n": "low"}, low_priority=True)
+    high = queue.enqueue({"n": "high"})
+    assert queue.claim("w")["id"] == high
+    assert queue.claim("w")["id"] == low
+
+
+def test_heartbeat_only_for_owner(queue):
+    job_id = queue.enqueue({})
+    queue.claim("w1")
+    assert queue.heartbeat(job_id, "w1")
+    assert not queue.heartbeat(job_id, "w2")
+
+
+def test_expired_lease_requeued_then_failed(queue, monkeypatch):
+    monkeypatch.setattr(jobqueue, "MAX_ATTEMPTS", 2)
+    job_id = queue.enqueue({})
+    queue.claim("w1", lease_seconds=-1)
+    assert queue.requeue_expired() == 1
+    assert queue.get(job_id)["status"] == QUEUED
+    # the crashed worker can no longer finish the job
+    assert not queue.heartbeat(job_id, "w1")
+
+    queue.claim("w2", lease_seconds=-1)
+    assert queue.requeue_expired() == 0
+    job = queue.get(job_id)
+    assert job["status"] == FAILED and job["attempts"] == 2
+
+
+def test_expire_files(queue):
+    queue.publish_file("f1", "/tmp/a.mp4")
+    assert queue.lookup_file("f1") == "/tmp/a.mp4"
+    assert queue.expire_files(3600) == []
+    assert queue.expire_files(-1) == ["/tmp/a.mp4"]
+    assert queue.lookup_file("f1") is None
+
+
+def test_sqlite_expire_files_drops_finished_jobs(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue({})
+    queue.claim("w")
+    queue.fail(job_id, "w", "boom")
+    queue.expire_files(-1)
+    assert queue.get(job_id) is None
+
+
+def test_redis_finished_jobs_expire():
+    r = StandInRedis()
+    queue = RedisJobQueue(r)
+    job_id = queue.enqueue({})
+    queue.claim("w")
+    queue.complete(job_id, "w", {})
+    assert r.ttls[queue._k_job(job_id)] == jobqueue.FINISHED_JOB_TTL_SECONDS
+
+
+def test_redis_crash_between_pop_and_lease_is_recovered(monkeypatch):
+    r = StandInRedis()
+    queue = RedisJobQueue(r)
+    job_id = queue.enqueue({})
+    # worker pops the id and dies before writing its lease
+    r.rpoplpush(queue.k_queue, queue.k_processing)
+
+    assert queue.requeue_expired() == 0  # first sighting only marks it
+    monkeypatch.setattr(jobqueue, "ORPHAN_GRACE_SECONDS", -1)
+    assert queue.requeue_expired() == 1
+    assert queue.get(job_id)["status"] == QUEUED
+    assert queue.claim("w2")["id"] == job_id
+    assert queue.requeue_expired() == 0  # leased now, not an orphan
+
+
+def test_redis_orphan_marker_cleared_once_leased():
+    r = StandInRedis()
+    queue = RedisJobQueue(r)
+    job_id = queue.enqueue({})
+    r.rpoplpush(queue.k_queue, queue.k_processing)
+    queue.requeue_expired()
+    r.zadd(queue.k_leases, {job_id: time.time() + 60})
+    queue.requeue_expired()
+    assert r.zscore(queue.k_orphans, job_id) is None
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoFileRegistry(JobQueue):
+        enqueue = claim = heartbeat = complete = fail = get = requeue_expired = lambda self, *a: None
+
+    with pytest.raises(TypeError, match="expire_files"):
+        NoFileRegistry()
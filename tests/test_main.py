@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import asyncio
+import threading
+import subprocess
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("dotenv")
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    # DOWNLOAD_ROOT is <cwd>/downloads; keep the import's side effects out of the repo
+    mp = pytest.MonkeyPatch()
+    mp.chdir(tmp_path_factory.mktemp("cwd"))
+    try:
+        from downloads import main
+    finally:
+        mp.undo()
+    return main
+
+
+@pytest.mark.parametrize("a, b", [
+    ("https://youtu.be/dQw4w9WgXcQ", "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10"),
+    ("https://www.youtube.com/shorts/dQw4w9WgXcQ", "https://m.youtube.com/watch?feature=x&v=dQw4w9WgXcQ"),
+    ("https://www.instagram.com/p/Cabc_12/", "https://instagram.com/reel/Cabc_12/?igsh=xyz"),
+    ("https://open.spotify.com/track/6rqhFgbbKwnb9MLmUQDhG6", "https://open.spotify.com/intl-de/track/6rqhFgbbKwnb9MLmUQDhG6?si=1"),
+    ("https://x.com/a/status/123", "https://twitter.com/a/status/123?s=20"),
+])
+def test_link_forms_of_one_item_share_a_key(main, a, b):
+    assert main.cache_key(main.detect_platform(a), a) == main.cache_key(main.detect_platform(b), b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("https://www.youtube.com/playlist?list=PLaaa", "https://www.youtube.com/playlist?list=PLbbb"),
+    ("https://www.youtube.com/attribution_link?u=/watch%3Fv%3DdQw4w9WgXcQ",
+     "https://www.youtube.com/attribution_link?u=/watch%3Fv%3DaaaaaaaaaaA"),
+    ("https://www.youtube.com/clip/UgkxAbCd", "https://www.youtube.com/clip/UgkxABCD"),
+])
+def test_unrecognized_links_keep_query_and_case(main, a, b):
+    assert main.cache_key("youtube", a) != main.cache_key("youtube", b)
+
+
+def test_fallback_key_drops_only_the_fragment(main):
+    assert main.canonical_url("youtube", "https://www.youtube.com/playlist?list=PLa#x") == \
+        "https://www.youtube.com/playlist?list=PLa"
+
+
+def test_youtube_key_includes_media_type(main):
+    url = "https://youtu.be/dQw4w9WgXcQ"
+    assert main.cache_key("youtube", url, "audio") != main.cache_key("youtube", url, "video")
+    assert main.cache_key("youtube", url) == main.cache_key("youtube", url, "bogus")
+
+
+def test_shared_file_lookup_runs_off_the_event_loop(main, monkeypatch):
+    threads = []
+
+    class Queue:
+        def lookup_file(self, file_id):
+            threads.append(threading.current_thread())
+            return None
+
+    monkeypatch.setattr(main, "JOB_QUEUE", Queue())
+    with pytest.raises(main.HTTPException) as e:
+        asyncio.run(main.serve_file("unknown", main.API_KEY))
+    assert e.value.status_code == 404
+    assert threads and threads[0] is not threading.main_thread()
+
+
+LAZY_IMPORT_CHECK = """
+import sys
+attempted = []
+
+class Recorder:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("yt_dlp", "instaloader"):
+            attempted.append(name)
+        return None
+
+sys.meta_path.insert(0, Recorder())
+import downloads.main
+print(attempted)
+"""
+
+
+def test_media_libraries_are_not_imported_with_main(tmp_path):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo, PRINT_API_KEY="0")
+    out = subprocess.run([sys.executable, "-c", LAZY_IMPORT_CHECK], cwd=str(tmp_path), env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+@pytest.fixture
+def startup_state(main, monkeypatch):
+    for k, v in (("ready", False), ("startup_seconds", 0.1), ("warmup_seconds", None),
+                 ("ready_seconds", None), ("warmup_failed", False)):
+        monkeypatch.setitem(main.STARTUP_STATE, k, v)
+    return main.STARTUP_STATE
+
+
+def healthz(main):
+    response = asyncio.run(main.healthz())
+    return response.status_code, json.loads(response.body)
+
+
+def test_healthz_not_ready_until_marked(main, startup_state):
+    assert healthz(main)[0] == 503
+    main.mark_ready()
+    status, body = healthz(main)
+    assert status == 200
+    assert body["ready"] and body["ready_seconds"] > 0 and body["startup_seconds"] == 0.1
+
+
+def test_failed_warmup_is_ready_without_details(main, startup_state, monkeypatch):
+    def warmup():
+        raise RuntimeError("login failed for user secret-account")
+
+    monkeypatch.setattr(main, "warmup", warmup)
+    asyncio.run(main.run_warmup())
+    status, body = healthz(main)
+    assert status == 200
+    assert body["warmup_failed"] is True and body["warmup_seconds"] is not None
+    assert "secret-account" not in json.dumps(body)
+
+
+def test_worker_trace_continues_under_enqueue_span(main, monkeypatch):
+    from downloads import tracing
+    monkeypatch.setattr(tracing, "export", lambda trace: None)
+    monkeypatch.setattr(tracing, "TRACE_FILE", os.devnull)
+    payloads = []
+
+    class Queue:
+        def enqueue(self, payload, low_priority=False):
+            payloads.append(payload)
+            return "j1"
+
+        def get(self, job_id):
+            return {"id": job_id, "status": main.DONE, "result": {"status": "ok"}}
+
+    monkeypatch.setattr(main, "JOB_QUEUE", Queue())
+    req = main.DownloadRequest(url="https://youtu.be/dQw4w9WgXcQ")
+
+    async def request():
+        with tracing.traced("POST /download", enabled=True) as trace:
+            return trace, await main.handle_download(req, trace)
+
+    trace, (status, _body) = asyncio.run(request())
+    assert status == 200
+    enqueue = next(s for s in trace.spans if s["name"] == "enqueue")
+    assert payloads[0]["trace"]["parent_span_id"] == enqueue["spanId"]
+
+
+def test_prefetch_off_keeps_no_state(main, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEYS", {"adm"})
+    assert not main.PREFETCH and main.PREFETCH_STATE is None
+    main.note_request("youtube", "https://youtu.be/dQw4w9WgXcQ", None)
+    assert not os.path.exists(os.path.join(main.DOWNLOAD_ROOT, ".blobs", "prefetch"))
+    assert asyncio.run(main.prefetch_status("adm")) == {"enabled": False, "watchlist": [], "hot": []}
+    with pytest.raises(main.HTTPException) as e:
+        asyncio.run(main.prefetch_watch(main.WatchlistRequest(urls=["https://youtu.be/dQw4w9WgXcQ"]), "adm"))
+    assert e.value.status_code == 409
+
+
+def test_prefetch_watchlist_and_counts(main, monkeypatch, tmp_path):
+    from downloads.prefetch import SharedPrefetchState
+    monkeypatch.setattr(main, "ADMIN_API_KEYS", {"adm"})
+    monkeypatch.setattr(main, "PREFETCH", True)
+    monkeypatch.setattr(main, "PREFETCH_STATE", SharedPrefetchState(str(tmp_path), 3600))
+    main.note_request("youtube", "https://youtu.be/dQw4w9WgXcQ", None)
+    asyncio.run(main.prefetch_watch(main.WatchlistRequest(urls=["https://x.com/a/status/1"]), "adm"))
+    status = asyncio.run(main.prefetch_status("adm"))
+    assert [w["key"] for w in status["watchlist"]] == ["x:1"]
+    assert [h["key"] for h in status["hot"]] == ["youtube:dQw4w9WgXcQ|video"]
+    asyncio.run(main.prefetch_unwatch("https://twitter.com/a/status/1", None, "adm"))
+    assert asyncio.run(main.prefetch_status("adm"))["watchlist"] == []
+
+
+def test_user_downloads_are_visible_to_prefetch(main, monkeypatch, tmp_path):
+    from downloads.prefetch import SharedPrefetchState
+    state = SharedPrefetchState(str(tmp_path / "prefetch"), 3600)
+    monkeypatch.setattr(main, "PREFETCH_STATE", state)
+    seen = []
+    monkeypatch.setattr(main, "run_download", lambda *args: seen.append(state.downloads_in_flight(60)) or "f")
+    assert main.run_user_download("youtube", "https://youtu.be/dQw4w9WgXcQ", str(tmp_path)) == "f"
+    assert seen == [1]
+    assert state.downloads_in_flight(60) == 0
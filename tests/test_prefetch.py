@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+
+from downloads.prefetch import PopularityTracker, SharedPrefetchState
+
+
+@pytest.fixture
+def processes(tmp_path):
+    """Two API processes' views of the same prefetch directory."""
+    root = str(tmp_path / "prefetch")
+    return SharedPrefetchState(root, 3600), SharedPrefetchState(root, 3600)
+
+
+def test_tracker_window_and_merge():
+    a, b = PopularityTracker(120), PopularityTracker(120)
+    a.record("k1", {"url": "1"}, now=1000)
+    a.record("k2", {"url": "2"}, now=1000)
+    b.record("k1", {"url": "1"}, now=1010)
+    b.record("k1", {"url": "1"}, now=1100)
+    a.merge(b.snapshot())
+    assert a.top(5, now=1100) == [("k1", 3, {"url": "1"}), ("k2", 1, {"url": "2"})]
+    assert a.top(5, min_count=2, now=1100) == [("k1", 3, {"url": "1"})]
+    # the 1000-1060 bucket has left the window
+    assert a.top(5, now=1240) == [("k1", 1, {"url": "1"})]
+
+
+def test_counts_are_merged_across_processes(processes):
+    p1, p2 = processes
+    p1.record("k", {"url": "u"})
+    p2.record("k", {"url": "u"})
+    p2.record("other", {"url": "o"})
+    assert [(k, n) for k, n, _ in p1.top(5)] == [("k", 1)]  # p2 hasn't published yet
+    p2.flush()
+    assert [(k, n) for k, n, _ in p1.top(5)] == [("k", 2), ("other", 1)]
+
+
+def test_stale_counts_are_dropped(processes):
+    p1, p2 = processes
+    p2.record("k", {"url": "u"})
+    p2.flush()
+    old = time.time() - 2 * 3600
+    os.utime(p2._counts_path, (old, old))
+    assert p1.top(5) == []
+    assert not os.path.exists(p2._counts_path)
+
+
+def test_watchlist_is_shared(processes):
+    p1, p2 = processes
+    p1.watch({"a": {"url": "ua"}, "b": {"url": "ub"}})
+    assert set(p2.watchlist()) == {"a", "b"}
+    assert p2.unwatch("a")
+    assert not p1.unwatch("a")
+    assert p1.watchlist() == {"b": {"url": "ub"}}
+
+
+def test_pending_marker_blocks_duplicate_jobs(processes):
+    p1, p2 = processes
+    assert p1.claim_pending("k", 600)
+    assert not p2.claim_pending("k", 600)
+    assert p2.claim_pending("k", -1)  # hold elapsed
+
+
+def test_one_leader_at_a_time(processes):
+    p1, p2 = processes
+    assert p1.try_lead()
+    assert p1.try_lead()
+    assert not p2.try_lead()
+    os.close(p1._leader_fd)  # leader process exits
+    assert p2.try_lead()
+
+
+def test_downloads_in_flight_across_processes(processes):
+    p1, p2 = processes
+    assert p1.downloads_in_flight(60) == 0
+    p2.download_started()
+    p2.download_started()
+    p1.download_started()
+    assert p1.downloads_in_flight(60) == 3
+    p2.download_finished()
+    assert p1.downloads_in_flight(60) == 2
+    # p2 stops flushing (process died mid-download): its count goes stale
+    old = time.time() - 120
+    os.utime(p2._active_path, (old, old))
+    assert p1.downloads_in_flight(60) == 1
+    p2.flush()
+    assert p1.downloads_in_flight(60) == 2
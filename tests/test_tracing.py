@@ -0,0 +1,66 @@
+import pstats
+import threading
+
+from downloads import tracing
+
+
+def _work_a():
+    return sum(range(10000))
+
+
+def _work_b():
+    return sum(range(10000))
+
+
+def _profiled_functions(path):
+    return {name for (_file, _line, name) in pstats.Stats(path).stats}
+
+
+def test_overlapping_profiles_do_not_mix(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "export", lambda trace: None)
+    traces = {}
+    a_profiling = threading.Event()
+    b_done = threading.Event()
+
+    def request_a():
+        with tracing.traced("a", enabled=True, profile=True) as trace:
+            traces["a"] = trace
+            with tracing.profiling():
+                a_profiling.set()
+                b_done.wait(5)
+                _work_a()
+
+    def request_b():
+        a_profiling.wait(5)
+        with tracing.traced("b", enabled=True, profile=True) as trace:
+            traces["b"] = trace
+            with tracing.profiling():
+                _work_b()
+        b_done.set()
+
+    threads = [threading.Thread(target=request_a), threading.Thread(target=request_b)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    a, b = traces["a"], traces["b"]
+    assert "_work_a" in _profiled_functions(a.profile_path)
+    assert a.root["attributes"]["profile.scope"] == tracing.PROFILE_SCOPE
+    if tracing.PROFILE_SCOPE == "thread":
+        assert "_work_b" not in _profiled_functions(a.profile_path)
+    assert b.profile_path is None
+    assert b.root["attributes"]["profile.skipped"]
+
+    # the lock is released again afterwards
+    with tracing.traced("c", enabled=True, profile=True) as c:
+        with tracing.profiling():
+            _work_a()
+    assert "_work_a" in _profiled_functions(c.profile_path)
+
+
+def test_profiling_without_trace_is_noop():
+    with tracing.profiling():
+        pass
+    assert not tracing._profile_lock.locked()